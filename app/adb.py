@@ -0,0 +1,78 @@
+import asyncio, contextvars, functools, os, blobstore, db, export, metrics, scheduler
+from concurrent.futures import ThreadPoolExecutor
+
+
+
+executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("DB_WORKERS", str(db.POOL_SIZE))),
+    thread_name_prefix="db"
+)
+
+def run_in_executor(func):
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        context.run(metrics.operation.set, func.__name__)
+        return await loop.run_in_executor(executor, functools.partial(context.run, func, *args, **kwargs))
+    return wrapper
+
+
+
+get_user_by_id = run_in_executor(db.get_user_by_id)
+get_users = run_in_executor(db.get_users)
+get_user_by_telegram = run_in_executor(db.get_user_by_telegram)
+get_users_by_ids = run_in_executor(db.get_users_by_ids)
+get_users_by_role = run_in_executor(db.get_users_by_role)
+set_user_surname = run_in_executor(db.set_user_surname)
+add_role = run_in_executor(db.add_role)
+remove_role = run_in_executor(db.remove_role)
+add_user = run_in_executor(db.add_user)
+
+get_subject_by_id = run_in_executor(db.get_subject_by_id)
+get_subjects = run_in_executor(db.get_subjects)
+get_active_subjects = run_in_executor(db.get_active_subjects)
+add_subject = run_in_executor(db.add_subject)
+set_subject_status = run_in_executor(db.set_subject_status)
+set_subject_name = run_in_executor(db.set_subject_name)
+
+get_lesson_by_id = run_in_executor(db.get_lesson_by_id)
+get_lessons = run_in_executor(db.get_lessons)
+get_lessons_by_date = run_in_executor(db.get_lessons_by_date)
+get_lessons_between = run_in_executor(db.get_lessons_between)
+get_lesson_by_date_index = run_in_executor(db.get_lesson_by_date_index)
+add_lesson = run_in_executor(db.add_lesson)
+
+get_lesson_attendance = run_in_executor(db.get_lesson_attendance)
+get_user_attendance = run_in_executor(db.get_user_attendance)
+get_user_on_lesson_attendance = run_in_executor(db.get_user_on_lesson_attendance)
+get_user_attendance_between = run_in_executor(db.get_user_attendance_between)
+set_attendance = run_in_executor(db.set_attendance)
+seed_attendance = run_in_executor(db.seed_attendance)
+get_user_summary = run_in_executor(db.get_user_summary)
+get_summary_overview = run_in_executor(db.get_summary_overview)
+
+get_duty_by_id = run_in_executor(db.get_duty_by_id)
+get_duty_by_date = run_in_executor(db.get_duty_by_date)
+get_duties_between = run_in_executor(db.get_duties_between)
+add_duty = run_in_executor(db.add_duty)
+set_duty_status = run_in_executor(db.set_duty_status)
+assign_to_duty = run_in_executor(db.assign_to_duty)
+unassign_to_duty = run_in_executor(db.unassign_to_duty)
+get_dutiers = run_in_executor(db.get_dutiers)
+get_duty_order = run_in_executor(db.get_duty_order)
+save_duty_plan = run_in_executor(db.save_duty_plan)
+add_duty_photo = run_in_executor(db.add_duty_photo)
+set_duty_photo_file_id = run_in_executor(db.set_duty_photo_file_id)
+get_duty_photo = run_in_executor(db.get_duty_photo)
+read_legacy_photo = run_in_executor(db.read_legacy_photo)
+
+add_group = run_in_executor(db.add_group)
+remove_group = run_in_executor(db.remove_group)
+get_groups = run_in_executor(db.get_groups)
+
+plan_duties = run_in_executor(scheduler.plan_duties)
+write_attendance = run_in_executor(export.write_attendance)
+
+put_blob = run_in_executor(blobstore.put)
+read_blob = run_in_executor(blobstore.read)
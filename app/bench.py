@@ -0,0 +1,148 @@
+import argparse, io, os, random, statistics, sys, tempfile, time, blobstore, db, metrics, migrate
+from datetime import date, timedelta
+from typing import Callable, Dict, List
+
+
+
+TABLES = ["attendance_summary", "last_duties", "duty_photos", "duty_assignments", "duties", "attendance", "lessons", "subjects", "roles", "groups", "users"]
+STATUSES = ["present"] * 8 + ["formal_present", "unpresent"]
+TELEGRAM_ID_BASE = 10_000_000
+
+
+
+def require_bench_database():
+    with db.connect() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT COUNT(*) FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = 'bench_instance'")
+            if not cur.fetchone()[0]:
+                print(f"Database '{os.getenv("MARIADB_DATABASE")}' is not a benchmark database (no bench_instance table, see db/bench.sql), refusing to wipe it")
+                sys.exit(1)
+
+def reset(cur):
+    cur.execute("SET FOREIGN_KEY_CHECKS = 0")
+    for table in TABLES:
+        cur.execute(f"TRUNCATE TABLE `{table}`")
+    cur.execute("SET FOREIGN_KEY_CHECKS = 1")
+
+def insert_chunked(cur, sql: str, rows: List, chunk: int = 5000):
+    for i in range(0, len(rows), chunk):
+        cur.executemany(sql, rows[i:i + chunk])
+
+def seed(users: int, days: int, lessons_per_day: int, duty_size: int, photo_kb: int, photo_share: float, rng: random.Random):
+    today = date.today()
+    workdays = [today - timedelta(days=i) for i in range(days, -1, -1) if (today - timedelta(days=i)).weekday() < 5]
+
+    require_bench_database()
+    with db.connect() as conn:
+        with conn.cursor() as cur:
+            reset(cur)
+            insert_chunked(cur, "INSERT INTO users (id, surname, telegram_id) VALUES (?, ?, ?)", [(i, f"Student{i:04d}", TELEGRAM_ID_BASE + i) for i in range(1, users + 1)])
+            roles = [(i, role) for i in range(1, users + 1) for role in ["student", "dutier"]] + [(1, "admin"), (1, "superadmin")]
+            insert_chunked(cur, "INSERT INTO roles (user_id, role) VALUES (?, ?)", roles)
+            insert_chunked(cur, "INSERT INTO subjects (id, name) VALUES (?, ?)", [(i, f"Subject {i}") for i in range(1, 9)])
+
+            lessons = [(day, index, rng.randint(1, 8)) for day in workdays for index in range(1, lessons_per_day + 1)]
+            insert_chunked(cur, "INSERT INTO lessons (id, subject_id, `index`, `date`) VALUES (?, ?, ?, ?)", [(i, subject, index, day) for i, (day, index, subject) in enumerate(lessons, start=1)])
+            attendance = [(lesson, user, rng.choice(STATUSES)) for lesson in range(1, len(lessons) + 1) for user in range(1, users + 1)]
+            insert_chunked(cur, "INSERT INTO attendance (lesson_id, user_id, status) VALUES (?, ?, ?)", attendance)
+
+            insert_chunked(cur, "INSERT INTO duties (id, `date`, status) VALUES (?, ?, ?)", [(i, day, "undone" if day == today else "done") for i, day in enumerate(workdays, start=1)])
+            assignments = [(duty, user) for duty in range(1, len(workdays) + 1) for user in rng.sample(range(1, users + 1), min(duty_size, users))]
+            insert_chunked(cur, "INSERT INTO duty_assignments (duty_id, user_id) VALUES (?, ?)", assignments)
+            for duty in range(1, len(workdays)):
+                if rng.random() < photo_share:
+                    sha256, size = blobstore.put(io.BytesIO(rng.randbytes(photo_kb * 1024)))
+                    cur.execute("INSERT INTO duty_photos (duty_id, user_id, sha256, size) VALUES (?, ?, ?, ?)", (duty, rng.randint(1, users), sha256, size))
+
+            db.refresh_last_duties(cur, "SELECT id FROM users")
+            db.refresh_attendance_summary(cur, "TRUE")
+            conn.commit()
+
+    return {"workdays": workdays, "lessons": len(lessons), "attendance": len(attendance), "duties": len(workdays)}
+
+
+
+def percentile(values: List[float], percent: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+def measure(name: str, call: Callable, iterations: int, warm_cache: bool) -> Dict:
+    latencies = []
+    queries = []
+    for _ in range(iterations):
+        if not warm_cache:
+            db.user_cache.clear()
+            db.user_ids_by_telegram.clear()
+        before = metrics.count()
+        started = time.perf_counter()
+        call()
+        latencies.append((time.perf_counter() - started) * 1000)
+        queries.append(metrics.count() - before)
+    return {
+        "name": name,
+        "p50": percentile(latencies, 50),
+        "p90": percentile(latencies, 90),
+        "p99": percentile(latencies, 99),
+        "mean": statistics.mean(latencies),
+        "queries": statistics.mean(queries)
+    }
+
+def get_cases(info: Dict, users: int, rng: random.Random) -> Dict[str, Callable]:
+    workdays = info["workdays"]
+    return {
+        "get_users": lambda: db.get_users(),
+        "get_users_by_role": lambda: db.get_users_by_role("student"),
+        "get_user_by_telegram": lambda: db.get_user_by_telegram(TELEGRAM_ID_BASE + rng.randint(1, users)),
+        "get_duty_order": lambda: db.get_duty_order(),
+        "get_rotation_stats": lambda: db.get_rotation_stats(),
+        "get_lesson_attendance": lambda: db.get_lesson_attendance(rng.randint(1, info["lessons"])),
+        "get_lessons_by_date": lambda: db.get_lessons_by_date(rng.choice(workdays)),
+        "get_duty_by_date": lambda: db.get_duty_by_date(rng.choice(workdays)),
+        "get_duties_between": lambda: db.get_duties_between(workdays[-5], workdays[-1]),
+        "get_user_summary": lambda: db.get_user_summary(rng.randint(1, users)),
+        "get_summary_overview": lambda: db.get_summary_overview()
+    }
+
+
+
+def run(args):
+    rng = random.Random(args.seed)
+    migrate.migrate()
+    started = time.perf_counter()
+    info = seed(args.users, args.days, args.lessons_per_day, args.duty_size, args.photo_kb, args.photo_share, rng)
+    print(f"Seeded {args.users} users, {info["lessons"]} lessons, {info["attendance"]} attendance rows, {info["duties"]} duties in {time.perf_counter() - started:.1f}s")
+
+    print(f"{"accessor":<24}{"p50 ms":>10}{"p90 ms":>10}{"p99 ms":>10}{"mean ms":>10}{"queries":>10}")
+    for name, call in get_cases(info, args.users, rng).items():
+        if args.only and name not in args.only:
+            continue
+        result = measure(name, call, args.iterations, args.warm_cache)
+        print(f"{result["name"]:<24}{result["p50"]:>10.2f}{result["p90"]:>10.2f}{result["p99"]:>10.2f}{result["mean"]:>10.2f}{result["queries"]:>10.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Seeds a synthetic dataset into the benchmark MariaDB (see the bench profile in docker-compose.yml, all existing rows are deleted) and benchmarks the db module")
+    parser.add_argument("--users", type=int, default=30)
+    parser.add_argument("--days", type=int, default=120)
+    parser.add_argument("--lessons-per-day", type=int, default=4)
+    parser.add_argument("--duty-size", type=int, default=2)
+    parser.add_argument("--photo-kb", type=int, default=256)
+    parser.add_argument("--photo-share", type=float, default=0.5)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--warm-cache", action="store_true", help="keep the user cache between calls")
+    parser.add_argument("--only", nargs="*", help="names of the accessors to benchmark")
+    parser.add_argument("--yes", action="store_true", help="do not ask before wiping the database")
+    args = parser.parse_args()
+
+    require_bench_database()
+    if not args.yes and input(f"All data in database '{os.getenv("MARIADB_DATABASE")}' will be deleted. Continue? [y/N] ").lower() != "y":
+        return
+
+    with tempfile.TemporaryDirectory(prefix="bench-photos-") as photos:
+        os.environ["PHOTO_STORE_PATH"] = photos
+        run(args)
+
+
+
+if __name__ == "__main__":
+    main()
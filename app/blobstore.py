@@ -0,0 +1,123 @@
+import fcntl, hashlib, os, tempfile, time
+from abc import ABC, abstractmethod
+from contextlib import AbstractContextManager, contextmanager
+from typing import BinaryIO, Iterator, Tuple
+
+
+
+CHUNK_SIZE = 1024 * 1024
+
+
+
+class BlobStore(ABC):
+    @abstractmethod
+    def put(self, file: BinaryIO) -> Tuple[str, int]:
+        pass
+
+    @abstractmethod
+    def open(self, key: str) -> BinaryIO:
+        pass
+
+    @abstractmethod
+    def exists(self, key: str) -> bool:
+        pass
+
+    @abstractmethod
+    def delete(self, key: str):
+        pass
+
+    @abstractmethod
+    def age(self, key: str) -> float:
+        pass
+
+    @abstractmethod
+    def keys(self) -> Iterator[str]:
+        pass
+
+    @abstractmethod
+    def lock(self) -> AbstractContextManager:
+        pass
+
+
+
+class FileBlobStore(BlobStore):
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(os.path.join(root, "tmp"), exist_ok=True)
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key[2:4], key)
+
+    def put(self, file: BinaryIO) -> Tuple[str, int]:
+        digest = hashlib.sha256()
+        size = 0
+        buffer = memoryview(bytearray(CHUNK_SIZE))
+        with tempfile.NamedTemporaryFile(dir=os.path.join(self.root, "tmp"), delete=False) as tmp:
+            try:
+                while read := file.readinto(buffer):
+                    digest.update(buffer[:read])
+                    tmp.write(buffer[:read])
+                    size += read
+            except BaseException:
+                os.unlink(tmp.name)
+                raise
+
+        key = digest.hexdigest()
+        path = self.path(key)
+        with self.lock():
+            if os.path.exists(path):
+                os.unlink(tmp.name)
+                os.utime(path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(tmp.name, path)
+        return key, size
+
+    def open(self, key: str) -> BinaryIO:
+        return open(self.path(key), "rb")
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self.path(key))
+
+    def delete(self, key: str):
+        if self.exists(key):
+            os.unlink(self.path(key))
+
+    def age(self, key: str) -> float:
+        return time.time() - os.path.getmtime(self.path(key))
+
+    def keys(self) -> Iterator[str]:
+        for directory, subdirectories, files in os.walk(self.root):
+            subdirectories[:] = [name for name in subdirectories if name != "tmp"]
+            yield from (name for name in files if len(name) == 64)
+
+    @contextmanager
+    def lock(self):
+        # flock is per open file, so this serialises threads of one process as well as other processes
+        with open(os.path.join(self.root, ".lock"), "a") as file:
+            fcntl.flock(file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(file, fcntl.LOCK_UN)
+
+
+
+BACKENDS = {
+    "file": lambda: FileBlobStore(os.getenv("PHOTO_STORE_PATH", "photos"))
+}
+
+store: BlobStore | None = None
+
+def get_store() -> BlobStore:
+    global store
+    if store is None:
+        store = BACKENDS[os.getenv("PHOTO_STORE", "file")]()
+    return store
+
+def put(file: BinaryIO) -> Tuple[str, int]:
+    return get_store().put(file)
+
+def read(key: str) -> bytes:
+    with get_store().open(key) as file:
+        return file.read()
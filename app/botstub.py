@@ -0,0 +1,168 @@
+import json, threading, time
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Tuple
+from urllib.parse import parse_qs
+from telegram.request import BaseRequest, RequestData
+
+
+
+FILE_CONTENT = bytes(range(256)) * 1024
+
+
+
+class BotApiStub:
+    def __init__(self):
+        self.calls: List[Dict] = []
+        self.updates: List[Dict] = []
+        self.condition = threading.Condition()
+        self.message_id = 0
+
+    def push_update(self, update: Dict):
+        with self.condition:
+            self.updates.append(update)
+            self.condition.notify_all()
+
+    def wait_for_call(self, chat_id: int, since: float, timeout: float) -> Dict | None:
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            while True:
+                for call in reversed(self.calls):
+                    if call["time"] < since:
+                        break
+                    if call["chat_id"] == chat_id:
+                        return call
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self.condition.wait(remaining)
+
+    def get_updates(self, params: Dict) -> List[Dict]:
+        offset = int(params.get("offset", 0))
+        deadline = time.monotonic() + float(params.get("timeout", 0))
+        with self.condition:
+            while True:
+                self.updates = [update for update in self.updates if update["update_id"] >= offset]
+                remaining = deadline - time.monotonic()
+                if self.updates or remaining <= 0:
+                    return list(self.updates)
+                self.condition.wait(remaining)
+
+    def message(self, params: Dict) -> Dict:
+        with self.condition:
+            self.message_id += 1
+            message_id = self.message_id
+        chat_id = int(params.get("chat_id", 0))
+        return {
+            "message_id": int(params.get("message_id", message_id)),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private" if chat_id > 0 else "group"},
+            "text": params.get("text", "")
+        }
+
+    def respond(self, method: str, params: Dict):
+        method = method.lower()
+        if method == "getupdates":
+            return self.get_updates(params)
+
+        with self.condition:
+            self.calls.append({
+                "method": method,
+                "chat_id": int(params["chat_id"]) if "chat_id" in params else None,
+                "time": time.monotonic()
+            })
+            self.condition.notify_all()
+
+        if method == "getme":
+            return {"id": 1, "is_bot": True, "first_name": "Stub", "username": "stub_bot", "can_join_groups": True, "can_read_all_group_messages": False, "supports_inline_queries": False}
+
+        elif method in ["sendmessage", "editmessagetext"]:
+            return self.message(params)
+
+        elif method == "getfile":
+            return {"file_id": params.get("file_id", "stub"), "file_unique_id": params.get("file_id", "stub"), "file_size": len(FILE_CONTENT), "file_path": "photos/stub.jpg"}
+
+        elif method in ["sendphoto", "senddocument"]:
+            message = self.message(params)
+            file = {"file_id": f"stub-{message["message_id"]}", "file_unique_id": f"stub-{message["message_id"]}", "width": 1280, "height": 960}
+            if method == "sendphoto":
+                message["photo"] = [file]
+            else:
+                message["document"] = file
+            return message
+
+        return True
+
+
+
+class StubRequest(BaseRequest):
+    def __init__(self, stub: BotApiStub):
+        self.stub = stub
+
+    @property
+    def read_timeout(self) -> float | None:
+        return None
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url: str, method: str, request_data: RequestData | None = None, read_timeout=None, write_timeout=None, connect_timeout=None, pool_timeout=None) -> Tuple[int, bytes]:
+        if "/file/" in url:
+            return 200, FILE_CONTENT
+
+        params = request_data.parameters if request_data else {}
+        result = self.stub.respond(url.rstrip("/").rsplit("/", 1)[-1], params)
+        return 200, json.dumps({"ok": True, "result": result}).encode()
+
+
+
+def parse_params(content_type: str, body: bytes) -> Dict:
+    if content_type.startswith("application/json"):
+        return json.loads(body or b"{}")
+
+    if content_type.startswith("multipart/form-data"):
+        message = BytesParser(policy=HTTP).parsebytes(f"Content-Type: {content_type}\r\n\r\n".encode() + body)
+        params = {}
+        for part in message.iter_parts():
+            if not part.get_filename():
+                params[part.get_param("name", header="content-disposition")] = part.get_content().strip()
+        return {key: decode_value(value) for key, value in params.items()}
+
+    return {key: decode_value(values[0]) for key, values in parse_qs(body.decode()).items()}
+
+def decode_value(value: str):
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
+
+
+
+def serve(stub: BotApiStub, host: str = "127.0.0.1", port: int = 8081) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if "/file/" in self.path:
+                payload = FILE_CONTENT
+            else:
+                params = parse_params(self.headers.get("Content-Type", ""), body)
+                result = stub.respond(self.path.rstrip("/").rsplit("/", 1)[-1], params)
+                payload = json.dumps({"ok": True, "result": result}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/octet-stream" if "/file/" in self.path else "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        do_GET = do_POST
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,94 @@
+import asyncio, httpx, os, adb
+from datetime import timedelta
+from typing import Dict, List
+from telegram import Bot
+from telegram.error import BadRequest, ChatMigrated, Forbidden, NetworkError, RetryAfter, TimedOut
+
+
+
+RATE = float(os.getenv("BROADCAST_RATE", "25"))
+GROUP_INTERVAL = float(os.getenv("BROADCAST_GROUP_INTERVAL", "3"))
+CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", "8"))
+RETRIES = int(os.getenv("BROADCAST_RETRIES", "3"))
+
+SENT = "sent"
+REMOVED = "removed"
+FAILED = "failed"
+UNKNOWN = "unknown"
+
+
+
+class RateLimiter:
+    def __init__(self, rate: float, chat_interval: float):
+        self.interval = 1 / rate
+        self.chat_interval = chat_interval
+        self.next_slot = 0.0
+        self.chat_slots: Dict[int, float] = {}
+        self.lock = asyncio.Lock()
+
+    async def wait(self, chat_id: int):
+        async with self.lock:
+            now = asyncio.get_running_loop().time()
+            slot = max(now, self.next_slot, self.chat_slots.get(chat_id, 0.0))
+            self.next_slot = slot + self.interval
+            self.chat_slots[chat_id] = slot + self.chat_interval
+        await asyncio.sleep(slot - now)
+
+limiter: RateLimiter | None = None
+
+def get_limiter() -> RateLimiter:
+    global limiter
+    if limiter is None:
+        limiter = RateLimiter(RATE, GROUP_INTERVAL)
+    return limiter
+
+
+
+async def send(bot: Bot, chat_id: int, text: str) -> str:
+    for attempt in range(RETRIES + 1):
+        await get_limiter().wait(chat_id)
+        try:
+            await bot.send_message(chat_id, text)
+            return SENT
+
+        except RetryAfter as e:
+            delay = e.retry_after.total_seconds() if isinstance(e.retry_after, timedelta) else e.retry_after
+            await asyncio.sleep(delay)
+
+        except ChatMigrated as e:
+            await adb.remove_group(chat_id)
+            await adb.add_group(e.new_chat_id)
+            chat_id = e.new_chat_id
+
+        except Forbidden:
+            await adb.remove_group(chat_id)
+            return REMOVED
+
+        except BadRequest as e:
+            if "chat not found" in e.message.lower():
+                await adb.remove_group(chat_id)
+                return REMOVED
+            return FAILED
+
+        except TimedOut as e:
+            # the request never reached Telegram, so it is safe to retry
+            if isinstance(e.__cause__, (httpx.ConnectTimeout, httpx.PoolTimeout)):
+                await asyncio.sleep(2 ** attempt)
+                continue
+            # Telegram may have delivered the message already, a retry could post it twice
+            return UNKNOWN
+
+        except NetworkError:
+            await asyncio.sleep(2 ** attempt)
+
+    return FAILED
+
+async def broadcast(bot: Bot, chat_ids: List[int], text: str) -> Dict[int, str]:
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+
+    async def deliver(chat_id: int) -> str:
+        async with semaphore:
+            return await send(bot, chat_id, text)
+
+    results = await asyncio.gather(*[deliver(chat_id) for chat_id in chat_ids])
+    return dict(zip(chat_ids, results))
@@ -1,4 +1,5 @@
-import mariadb, os, sys
+import io, mariadb, metrics, os, sys, threading, time
+from collections import OrderedDict
 from datetime import datetime
 from typing import Dict, List, Tuple
 from dataclasses import dataclass
@@ -39,6 +40,13 @@ class Attendance:
     lesson_id: int
     status: str
 
+@dataclass
+class AttendanceSummary:
+    name: str
+    present: int
+    formal_present: int
+    unpresent: int
+
 
 
 @dataclass
@@ -54,69 +62,178 @@ class DutyPhoto:
     id: int
     duty_id: int
     user_id: int
-    blob: bytearray
+    file_id: str | None
+    sha256: str | None
+    preview_sha256: str | None
 
 
 
-def get_conn() -> mariadb.Connection:
+POOL_SIZE = int(os.getenv("MARIADB_POOL_SIZE", "10"))
+POOL_VALIDATION_INTERVAL = int(os.getenv("MARIADB_POOL_VALIDATION_INTERVAL", "500"))
+pool: mariadb.ConnectionPool | None = None
+pool_lock = threading.Lock()
+
+def get_conn_params() -> Dict:
+    return {
+        "host": os.getenv("MARIADB_HOST"),
+        "port": int(os.getenv("MARIADB_PORT")),
+        "database": os.getenv("MARIADB_DATABASE"),
+        "user": os.getenv("MARIADB_USER"),
+        "password": os.getenv("MARIADB_PASSWORD")
+    }
+
+def connect() -> mariadb.Connection:
     try:
-        conn = mariadb.connect(
-            host=os.getenv("MARIADB_HOST"),
-            port=int(os.getenv("MARIADB_PORT")),
-            database=os.getenv("MARIADB_DATABASE"),
-            user=os.getenv("MARIADB_USER"),
-            password=os.getenv("MARIADB_PASSWORD")
-        )
-        return conn
+        return mariadb.connect(**get_conn_params())
     except mariadb.Error as e:
         print(f"Error connecting to MariaDB Platform: {e}")
         sys.exit(1)
 
+def get_pool() -> mariadb.ConnectionPool:
+    global pool
+    with pool_lock:
+        if pool is None:
+            try:
+                pool = mariadb.ConnectionPool(
+                    pool_name="bot",
+                    pool_size=POOL_SIZE,
+                    pool_validation_interval=POOL_VALIDATION_INTERVAL,
+                    **get_conn_params()
+                )
+            except mariadb.Error as e:
+                print(f"Error connecting to MariaDB Platform: {e}")
+                sys.exit(1)
+        return pool
+
+def get_conn() -> metrics.Connection:
+    # the pool validates connections idle longer than POOL_VALIDATION_INTERVAL ms and reconnects them;
+    # an exhausted pool or a failed reconnect falls back to a direct connection
+    try:
+        return metrics.Connection(get_pool().get_connection())
+    except mariadb.Error:
+        return metrics.Connection(connect())
+
+
+
+USER_COLUMNS = "users.id, users.surname, users.telegram_id, GROUP_CONCAT(roles.role ORDER BY roles.id SEPARATOR ',')"
+
+def user_from_row(row: Tuple) -> User:
+    return User(row[0], row[1], row[2], row[3].split(",") if row[3] else [])
+
+def fetch_users(cur: mariadb.Cursor, condition: str = "TRUE", params: Tuple = ()) -> List[User]:
+    cur.execute(
+        f"SELECT {USER_COLUMNS} FROM users LEFT JOIN roles ON roles.user_id = users.id WHERE {condition} GROUP BY users.id ORDER BY users.surname ASC",
+        params
+    )
+    return [user_from_row(row) for row in cur.fetchall()]
+
+def fetch_users_by_ids(cur: mariadb.Cursor, ids: List[int]) -> List[User]:
+    if not ids:
+        return []
+    users = {user.id: user for user in fetch_users(cur, f"users.id IN ({", ".join("?" * len(ids))})", tuple(ids))}
+    return [users[id] for id in ids if id in users]
+
+
+
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "512"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "300"))
+user_cache: OrderedDict[int, Tuple[float, User]] = OrderedDict()
+user_ids_by_telegram: Dict[int, int] = {}
+user_cache_lock = threading.Lock()
+# invalidate_user stamps the ids it drops with a new generation; a row read before that stamp is not cached
+user_cache_generation = 0
+invalidated_ids: Dict[int, int] = {}
+invalidated_telegram_ids: Dict[int, int] = {}
+
+def get_user_cache_generation() -> int:
+    with user_cache_lock:
+        return user_cache_generation
+
+def get_cached_user(id: int | None) -> User | None:
+    with user_cache_lock:
+        entry = user_cache.get(id)
+        if not entry:
+            return None
+        
+        if time.monotonic() - entry[0] > USER_CACHE_TTL:
+            del user_cache[id]
+            user_ids_by_telegram.pop(entry[1].telegram_id, None)
+            return None
+        
+        user_cache.move_to_end(id)
+        return entry[1]
+
+def cache_user(user: User | None, generation: int):
+    if not user:
+        return
+    
+    with user_cache_lock:
+        if invalidated_ids.get(user.id, 0) > generation or invalidated_telegram_ids.get(user.telegram_id, 0) > generation:
+            return
+
+        user_cache[user.id] = (time.monotonic(), user)
+        user_cache.move_to_end(user.id)
+        user_ids_by_telegram[user.telegram_id] = user.id
+        while len(user_cache) > USER_CACHE_SIZE:
+            _, (_, evicted) = user_cache.popitem(last=False)
+            user_ids_by_telegram.pop(evicted.telegram_id, None)
+
+def invalidate_user(id: int | None = None, telegram_id: int | None = None):
+    global user_cache_generation
+    with user_cache_lock:
+        user_cache_generation += 1
+        if telegram_id is not None:
+            invalidated_telegram_ids[telegram_id] = user_cache_generation
+        id = user_ids_by_telegram.get(telegram_id) if id is None else int(id)
+        if id is not None:
+            invalidated_ids[id] = user_cache_generation
+        entry = user_cache.pop(id, None)
+        if entry:
+            user_ids_by_telegram.pop(entry[1].telegram_id, None)
+        user_ids_by_telegram.pop(telegram_id, None)
+
 
 
 def get_user_by_id(id: int) -> User | None:
+    user = get_cached_user(int(id))
+    if user:
+        return user
+    
+    generation = get_user_cache_generation()
     with get_conn() as conn:
         with conn.cursor() as cur:
-            cur.execute(
-                "SELECT id, surname, telegram_id FROM users WHERE id = ?",
-                (id,)
-            )
-            user = cur.fetchone()
-            cur.execute(
-                "SELECT role FROM roles WHERE user_id = ?",
-                (id,)
-            )
-            roles = cur.fetchall()
-            return User(user[0], user[1], user[2], [role[0] for role in roles] if roles else []) if user else None
+            users = fetch_users(cur, "users.id = ?", (id,))
+            user = users[0] if users else None
+            cache_user(user, generation)
+            return user
 
 def get_users() -> List[User]:
     with get_conn() as conn:
         with conn.cursor() as cur:
-            cur.execute(
-                "SELECT id FROM users ORDER BY surname ASC"
-            )
-            users = cur.fetchall()
-            return [get_user_by_id(user[0]) for user in users] if users else []
+            return fetch_users(cur)
 
 def get_user_by_telegram(telegram_id: int) -> User | None:
+    user = get_cached_user(user_ids_by_telegram.get(telegram_id))
+    if user:
+        return user
+    
+    generation = get_user_cache_generation()
     with get_conn() as conn:
         with conn.cursor() as cur:
-            cur.execute(
-                "SELECT id FROM users WHERE telegram_id = ?",
-                (telegram_id,)
-            )
-            id = cur.fetchone()
-            return get_user_by_id(id[0]) if id else None
+            users = fetch_users(cur, "users.telegram_id = ?", (telegram_id,))
+            user = users[0] if users else None
+            cache_user(user, generation)
+            return user
+
+def get_users_by_ids(ids: List[int]) -> List[User]:
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            return fetch_users_by_ids(cur, ids)
 
 def get_users_by_role(role: str) -> List[User]:
     with get_conn() as conn:
         with conn.cursor() as cur:
-            cur.execute(
-                "SELECT users.id FROM users JOIN roles ON roles.user_id = users.id WHERE roles.role = ? ORDER BY users.surname",
-                (role,)
-            )
-            users = cur.fetchall()
-            return [get_user_by_id(user[0]) for user in users] if users else []
+            return fetch_users(cur, "users.id IN (SELECT user_id FROM roles WHERE role = ?)", (role,))
         
 def set_user_surname(user_id: int, surname: str):
     with get_conn() as conn:
@@ -126,22 +243,18 @@ def set_user_surname(user_id: int, surname: str):
                 (surname, user_id)
             )
             conn.commit()
+    invalidate_user(user_id)
 
 def add_role(user_id: int, role: str):
     with get_conn() as conn:
         with conn.cursor() as cur:
-            user = get_user_by_id(user_id)
-            if not user:
-                return
-            
-            if role in user.roles:
-                return
-            
             cur.execute(
-                "INSERT INTO roles (user_id, role) VALUES (?, ?)",
-                (user_id, role)
+                "INSERT INTO roles (user_id, role) SELECT id, ? FROM users WHERE id = ?\n" \
+                "ON DUPLICATE KEY UPDATE roles.id = roles.id",
+                (role, user_id)
             )
             conn.commit()
+    invalidate_user(user_id)
 
 def remove_role(user_id: int, role: str):
     with get_conn() as conn:
@@ -151,18 +264,17 @@ def remove_role(user_id: int, role: str):
                 (user_id, role)
             )
             conn.commit()
+    invalidate_user(user_id)
 
 def add_user(surname: str, telegram_id: int):
     with get_conn() as conn:
         with conn.cursor() as cur:
-            if get_user_by_telegram(telegram_id):
-                return
-            
             cur.execute(
-                "INSERT INTO users (surname, telegram_id) VALUES (?, ?)",
+                "INSERT INTO users (surname, telegram_id) VALUES (?, ?) ON DUPLICATE KEY UPDATE id = id",
                 (surname, telegram_id)
             )
             conn.commit()
+    invalidate_user(telegram_id=telegram_id)
 
 
 
@@ -223,34 +335,38 @@ def set_subject_name(subject_id: int, name: str):
 
 
 
+def fetch_lessons(cur: mariadb.Cursor, condition: str, params: Tuple = ()) -> List[Lesson]:
+    cur.execute(
+        "SELECT lessons.id, subjects.id, subjects.name, subjects.is_active, lessons.`index`, lessons.`date`\n" \
+        "FROM lessons JOIN subjects ON subjects.id = lessons.subject_id\n" \
+        f"WHERE {condition}\n" \
+        "ORDER BY lessons.`date` ASC, lessons.`index` ASC",
+        params
+    )
+    return [Lesson(row[0], Subject(row[1], row[2], row[3]), row[4], row[5]) for row in cur.fetchall()]
+
+
+
 def get_lesson_by_id(id: int) -> Lesson | None:
     with get_conn() as conn:
         with conn.cursor() as cur:
-            cur.execute(
-                "SELECT id, subject_id, `index`, `date` FROM lessons WHERE id = ?",
-                (id,)
-            )
-            lesson = cur.fetchone()
-            return Lesson(lesson[0], get_subject_by_id(lesson[1]), lesson[2], lesson[3]) if lesson else None
+            lessons = fetch_lessons(cur, "lessons.id = ?", (id,))
+            return lessons[0] if lessons else None
 
 def get_lessons() -> List[Lesson]:
     with get_conn() as conn:
         with conn.cursor() as cur:
-            cur.execute(
-                "SELECT id FROM lessons"
-            )
-            lessons = cur.fetchall()
-            return [get_lesson_by_id(lesson[0]) for lesson in lessons] if lessons else []
+            return fetch_lessons(cur, "TRUE")
         
 def get_lessons_by_date(date: datetime) -> List[Lesson]:
     with get_conn() as conn:
         with conn.cursor() as cur:
-            cur.execute(
-                "SELECT id FROM lessons WHERE `date` = ? ORDER BY `index` ASC",
-                (date,)
-            )
-            lessons = cur.fetchall()
-            return [get_lesson_by_id(lesson[0]) for lesson in lessons] if lessons else []
+            return fetch_lessons(cur, "lessons.`date` = ?", (date,))
+
+def get_lessons_between(start: datetime, end: datetime) -> List[Lesson]:
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            return fetch_lessons(cur, "lessons.`date` BETWEEN ? AND ?", (start, end))
         
 def get_lesson_by_date_index(date: datetime, index: int) -> Lesson | None:
     with get_conn() as conn:
@@ -265,21 +381,57 @@ def get_lesson_by_date_index(date: datetime, index: int) -> Lesson | None:
 def add_lesson(subject_id: int, index: int, date: datetime):
     with get_conn() as conn:
         with conn.cursor() as cur:
-            lesson = get_lesson_by_date_index(date, index)
-            if lesson:
-                cur.execute(
-                    "UPDATE lessons SET subject_id = ? WHERE id = ?",
-                    (subject_id, lesson.id)
-                )
-            else:
-                cur.execute(
-                    "INSERT INTO lessons (subject_id, `index`, `date`) VALUES (?, ?, ?)",
-                    (subject_id, index, date)
-                )
+            cur.execute(
+                "SELECT id, subject_id FROM lessons WHERE `date` = ? AND `index` = ? FOR UPDATE",
+                (date, index)
+            )
+            lesson = cur.fetchone()
+            cur.execute(
+                "INSERT INTO lessons (subject_id, `index`, `date`) VALUES (?, ?, ?)\n" \
+                "ON DUPLICATE KEY UPDATE subject_id = VALUES(subject_id)",
+                (subject_id, index, date)
+            )
+            if lesson and lesson[1] != int(subject_id):
+                add_lesson_to_summary(cur, lesson[0], lesson[1], -1)
+                add_lesson_to_summary(cur, lesson[0], subject_id, 1)
             conn.commit()
 
 
 
+SUMMARY_DELTA = "ON DUPLICATE KEY UPDATE present = present + VALUES(present), formal_present = formal_present + VALUES(formal_present), unpresent = unpresent + VALUES(unpresent)"
+
+def add_lesson_to_summary(cur: mariadb.Cursor, lesson_id: int, subject_id: int, sign: int):
+    cur.execute(
+        "INSERT INTO attendance_summary (user_id, subject_id, present, formal_present, unpresent)\n" \
+        "SELECT user_id, ?, ? * (status = 'present'), ? * (status = 'formal_present'), ? * (status = 'unpresent') FROM attendance\n" \
+        "WHERE lesson_id = ?\n" \
+        f"{SUMMARY_DELTA}",
+        (subject_id, sign, sign, sign, lesson_id)
+    )
+
+def move_in_summary(cur: mariadb.Cursor, lesson_id: int, user_id: int, old: str | None, new: str):
+    cur.execute(
+        "INSERT INTO attendance_summary (user_id, subject_id, present, formal_present, unpresent)\n" \
+        "SELECT ?, subject_id, (? = 'present') - (? <=> 'present'), (? = 'formal_present') - (? <=> 'formal_present'), (? = 'unpresent') - (? <=> 'unpresent') FROM lessons\n" \
+        "WHERE id = ?\n" \
+        f"{SUMMARY_DELTA}",
+        (user_id, new, old, new, old, new, old, lesson_id)
+    )
+
+def refresh_attendance_summary(cur: mariadb.Cursor, condition: str, params: Tuple = ()):
+    cur.execute(
+        f"DELETE FROM attendance_summary WHERE {condition}",
+        params
+    )
+    cur.execute(
+        "INSERT INTO attendance_summary (user_id, subject_id, present, formal_present, unpresent)\n" \
+        "SELECT user_id, subject_id, SUM(status = 'present'), SUM(status = 'formal_present'), SUM(status = 'unpresent') FROM attendance\n" \
+        "JOIN lessons ON lessons.id = attendance.lesson_id\n" \
+        f"WHERE {condition}\n" \
+        "GROUP BY user_id, subject_id",
+        params
+    )
+
 def get_lesson_attendance(lesson_id: int) -> List[Attendance]:
     with get_conn() as conn:
         with conn.cursor() as cur:
@@ -310,65 +462,162 @@ def get_user_on_lesson_attendance(user_id: int, lesson_id: int) -> Attendance |
             attendance = cur.fetchone()
             return Attendance(user_id, lesson_id, attendance[0]) if attendance else None
 
+def get_user_attendance_between(user_id: int, start: datetime, end: datetime) -> List[Attendance]:
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT attendance.lesson_id, attendance.user_id, attendance.status FROM attendance\n" \
+                "JOIN lessons ON lessons.id = attendance.lesson_id\n" \
+                "WHERE attendance.user_id = ? AND lessons.`date` BETWEEN ? AND ?",
+                (user_id, start, end)
+            )
+            attendance = cur.fetchall()
+            return [Attendance(att[1], att[0], att[2]) for att in attendance] if attendance else []
+
+def iter_attendance_between(start: datetime, end: datetime):
+    with get_conn() as conn:
+        with conn.cursor(buffered=False) as cur:
+            cur.execute(
+                "SELECT users.id, users.surname, attendance.lesson_id, attendance.status FROM attendance\n" \
+                "JOIN lessons ON lessons.id = attendance.lesson_id\n" \
+                "JOIN users ON users.id = attendance.user_id\n" \
+                "WHERE lessons.`date` BETWEEN ? AND ?\n" \
+                "ORDER BY users.surname ASC, users.id ASC",
+                (start, end)
+            )
+            for row in cur:
+                yield row
+
 def set_attendance(lesson_id: int, user_id: int, status: str):
     with get_conn() as conn:
         with conn.cursor() as cur:
             cur.execute(
-                "SELECT id FROM attendance WHERE lesson_id = ? AND user_id = ?",
+                "SELECT status FROM attendance WHERE lesson_id = ? AND user_id = ? FOR UPDATE",
                 (lesson_id, user_id)
             )
-            att = cur.fetchone()
-            if att:
-                cur.execute(
-                    "UPDATE attendance SET status = ? WHERE lesson_id = ? AND user_id = ?",
-                    (status, lesson_id, user_id)
-                )
-            else:
-                cur.execute(
-                    "INSERT INTO attendance (lesson_id, user_id, status) VALUES (?, ?, ?)",
-                    (lesson_id, user_id, status)
-                )
-            conn.commit()
-
+            old = cur.fetchone()
+            old = old[0] if old else None
+            if old == status:
+                conn.commit()
+                return
 
+            cur.execute(
+                "INSERT INTO attendance (lesson_id, user_id, status) VALUES (?, ?, ?)\n" \
+                "ON DUPLICATE KEY UPDATE status = VALUES(status)",
+                (lesson_id, user_id, status)
+            )
+            move_in_summary(cur, lesson_id, user_id, old, status)
+            conn.commit()
 
-def get_duty_by_id(id: int) -> Duty | None:
+def seed_attendance(lesson_id: int, status: str):
     with get_conn() as conn:
         with conn.cursor() as cur:
+            # count only the students that get a new row; the INSERT ... SELECT locks the attendance range it reads
             cur.execute(
-                "SELECT duties.id, date, status, duty_photos.id FROM duties LEFT JOIN duty_photos ON duty_photos.duty_id = duties.id WHERE duties.id = ?",
-                (id,)
+                "INSERT INTO attendance_summary (user_id, subject_id, present, formal_present, unpresent)\n" \
+                "SELECT DISTINCT roles.user_id, lessons.subject_id, ? = 'present', ? = 'formal_present', ? = 'unpresent' FROM roles\n" \
+                "JOIN lessons ON lessons.id = ?\n" \
+                "WHERE roles.role = 'student' AND NOT EXISTS (\n" \
+                "SELECT 1 FROM attendance WHERE attendance.lesson_id = lessons.id AND attendance.user_id = roles.user_id\n" \
+                ")\n" \
+                f"{SUMMARY_DELTA}",
+                (status, status, status, lesson_id)
             )
-            duty = cur.fetchone()
             cur.execute(
-                "SELECT user_id FROM duty_assignments WHERE duty_id = ?",
-                (id,)
+                "INSERT INTO attendance (lesson_id, user_id, status)\n" \
+                "SELECT DISTINCT ?, roles.user_id, ? FROM roles WHERE roles.role = 'student'\n" \
+                "ON DUPLICATE KEY UPDATE attendance.id = attendance.id",
+                (lesson_id, status)
             )
-            dutiers = cur.fetchall()
-            return Duty(duty[0], duty[1], duty[2], [get_user_by_id(dutier[0]) for dutier in dutiers] if dutiers else [], duty[3]) if duty else None
+            conn.commit()
 
-def get_duty_by_date(date: datetime) -> Duty | None:
+def get_user_summary(user_id: int) -> List[AttendanceSummary]:
     with get_conn() as conn:
         with conn.cursor() as cur:
             cur.execute(
-                "SELECT id FROM duties WHERE `date` = ?",
-                (date,)
+                "SELECT subjects.name, present, formal_present, unpresent FROM attendance_summary\n" \
+                "JOIN subjects ON subjects.id = attendance_summary.subject_id\n" \
+                "WHERE user_id = ? ORDER BY subjects.name ASC",
+                (user_id,)
+            )
+            return [AttendanceSummary(*row) for row in cur.fetchall()]
+
+def get_summary_overview() -> List[AttendanceSummary]:
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT users.surname, SUM(present), SUM(formal_present), SUM(unpresent) FROM attendance_summary\n" \
+                "JOIN users ON users.id = attendance_summary.user_id\n" \
+                "GROUP BY users.id, users.surname ORDER BY SUM(unpresent) DESC, users.surname ASC"
             )
-            duty = cur.fetchone()
-            return get_duty_by_id(duty[0]) if duty else None
+            return [AttendanceSummary(row[0], int(row[1]), int(row[2]), int(row[3])) for row in cur.fetchall()]
+
+
+
+def fetch_duties(cur: mariadb.Cursor, condition: str, params: Tuple = ()) -> List[Duty]:
+    cur.execute(
+        "SELECT duties.id, duties.date, duties.status,\n" \
+        "(SELECT MIN(duty_photos.id) FROM duty_photos WHERE duty_photos.duty_id = duties.id),\n" \
+        "users.id, users.surname, users.telegram_id, user_roles.roles\n" \
+        "FROM duties\n" \
+        "LEFT JOIN duty_assignments ON duty_assignments.duty_id = duties.id\n" \
+        "LEFT JOIN users ON users.id = duty_assignments.user_id\n" \
+        "LEFT JOIN (\n" \
+        "SELECT user_id, GROUP_CONCAT(role ORDER BY id SEPARATOR ',') AS roles FROM roles GROUP BY user_id\n" \
+        ") AS user_roles ON user_roles.user_id = users.id\n" \
+        f"WHERE {condition}\n" \
+        "ORDER BY duties.date ASC, duty_assignments.id ASC",
+        params
+    )
+    duties: Dict[int, Duty] = {}
+    for row in cur.fetchall():
+        duty = duties.setdefault(row[0], Duty(row[0], row[1], row[2], [], row[3]))
+        if row[4] is not None and all(dutier.id != row[4] for dutier in duty.dutiers):
+            duty.dutiers.append(user_from_row(row[4:]))
+    return list(duties.values())
+
+
+
+def get_duty_by_id(id: int) -> Duty | None:
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            duties = fetch_duties(cur, "duties.id = ?", (id,))
+            return duties[0] if duties else None
+
+def get_duty_by_date(date: datetime) -> Duty | None:
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            duties = fetch_duties(cur, "duties.date = ?", (date,))
+            return duties[0] if duties else None
+
+def get_duties_between(start: datetime, end: datetime) -> List[Duty]:
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            return fetch_duties(cur, "duties.date BETWEEN ? AND ?", (start, end))
 
 def add_duty(date: datetime):
     with get_conn() as conn:
         with conn.cursor() as cur:
-            if get_duty_by_date(date):
-                return
-            
             cur.execute(
-                "INSERT INTO duties (`date`, status) VALUES (?, 'undone')",
+                "INSERT INTO duties (`date`, status) VALUES (?, 'undone') ON DUPLICATE KEY UPDATE id = id",
                 (date,)
             )
             conn.commit()
 
+def refresh_last_duties(cur: mariadb.Cursor, condition: str, params: Tuple = ()):
+    cur.execute(
+        f"DELETE FROM last_duties WHERE user_id IN ({condition})",
+        params
+    )
+    cur.execute(
+        "INSERT INTO last_duties (user_id, `date`)\n" \
+        "SELECT duty_assignments.user_id, MAX(duties.date) FROM duty_assignments\n" \
+        "JOIN duties ON duties.id = duty_assignments.duty_id AND duties.status = 'done'\n" \
+        f"WHERE duty_assignments.user_id IN ({condition})\n" \
+        "GROUP BY duty_assignments.user_id",
+        params
+    )
+
 def set_duty_status(duty_id: int, status: str):
     with get_conn() as conn:
         with conn.cursor() as cur:
@@ -376,15 +625,17 @@ def set_duty_status(duty_id: int, status: str):
                 "UPDATE duties SET status = ? WHERE id = ?",
                 (status, duty_id)
             )
+            refresh_last_duties(cur, "SELECT user_id FROM duty_assignments WHERE duty_id = ?", (duty_id,))
             conn.commit()
 
 def assign_to_duty(duty_id: int, user_id: int):
     with get_conn() as conn:
         with conn.cursor() as cur:
             cur.execute(
-                "INSERT INTO duty_assignments (duty_id, user_id) VALUES (?, ?)",
+                "INSERT INTO duty_assignments (duty_id, user_id) VALUES (?, ?) ON DUPLICATE KEY UPDATE id = id",
                 (duty_id, user_id)
             )
+            refresh_last_duties(cur, "?", (user_id,))
             conn.commit()
 
 def unassign_to_duty(duty_id: int, user_id: int):
@@ -394,6 +645,7 @@ def unassign_to_duty(duty_id: int, user_id: int):
                 "DELETE FROM duty_assignments WHERE duty_id = ? AND user_id = ?",
                 (duty_id, user_id)
             )
+            refresh_last_duties(cur, "?", (user_id,))
             conn.commit()
 
 def get_dutiers(duty_id: int) -> List[User]:
@@ -404,33 +656,92 @@ def get_dutiers(duty_id: int) -> List[User]:
                 (duty_id,)
             )
             dutiers = cur.fetchall()
-            return [get_user_by_id(dutier[0]) for dutier in dutiers] if dutiers else []
+            return fetch_users_by_ids(cur, [dutier[0] for dutier in dutiers])
         
 def get_duty_order() -> List[User]:
     with get_conn() as conn:
         with conn.cursor() as cur:
             cur.execute(
-                "SELECT users.id, users.surname, MAX(CASE WHEN duties.status = 'done' THEN duties.date END) AS last_duty\n" \
-                "FROM users\n" \
-                "JOIN roles ON roles.user_id = users.id AND roles.role = 'dutier'\n" \
-                "JOIN attendance ON attendance.user_id = users.id AND attendance.status = 'present'\n" \
-                "JOIN lessons ON lessons.id = attendance.lesson_id AND lessons.date = CURDATE() AND lessons.index = (\n" \
-                "SELECT MAX(`index`) FROM lessons WHERE date = CURDATE()\n" \
+                "SELECT users.id FROM users\n" \
+                "LEFT JOIN last_duties ON last_duties.user_id = users.id\n" \
+                "WHERE users.id IN (SELECT user_id FROM roles WHERE role = 'dutier')\n" \
+                "AND users.id IN (\n" \
+                "SELECT attendance.user_id FROM lessons\n" \
+                "JOIN attendance ON attendance.lesson_id = lessons.id AND attendance.status = 'present'\n" \
+                "WHERE lessons.date = CURDATE() AND lessons.index = (SELECT MAX(`index`) FROM lessons WHERE date = CURDATE())\n" \
                 ")\n" \
-                "LEFT JOIN duty_assignments ON duty_assignments.user_id = users.id\n" \
-                "LEFT JOIN duties ON duties.id = duty_assignments.duty_id\n" \
-                "GROUP BY users.id, users.surname\n" \
-                "ORDER BY MAX(CASE WHEN duties.status = 'done' THEN duties.date END) IS NOT NULL, MAX(CASE WHEN duties.status = 'done' THEN duties.date END) ASC, users.surname ASC"
+                "ORDER BY last_duties.date IS NOT NULL, last_duties.date ASC, users.surname ASC"
             )
             dutiers = cur.fetchall()
-            return [get_user_by_id(dutier[0]) for dutier in dutiers] if dutiers else []
+            return fetch_users_by_ids(cur, [dutier[0] for dutier in dutiers])
+
+def get_rotation_stats() -> List[Tuple[User, int, datetime | None, Dict[int, float]]]:
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            dutiers = fetch_users(cur, "users.id IN (SELECT user_id FROM roles WHERE role = 'dutier')")
+            if not dutiers:
+                return []
+            
+            placeholders = ", ".join("?" * len(dutiers))
+            ids = tuple(dutier.id for dutier in dutiers)
+            cur.execute(
+                "SELECT users.id, COUNT(duty_assignments.id), last_duties.date FROM users\n" \
+                "LEFT JOIN duty_assignments ON duty_assignments.user_id = users.id\n" \
+                "LEFT JOIN last_duties ON last_duties.user_id = users.id\n" \
+                f"WHERE users.id IN ({placeholders})\n" \
+                "GROUP BY users.id, last_duties.date",
+                ids
+            )
+            duties = {row[0]: (row[1], row[2]) for row in cur.fetchall()}
+            cur.execute(
+                "SELECT attendance.user_id, WEEKDAY(lessons.date), AVG(attendance.status <> 'unpresent') FROM attendance\n" \
+                "JOIN lessons ON lessons.id = attendance.lesson_id\n" \
+                f"WHERE attendance.user_id IN ({placeholders})\n" \
+                "GROUP BY attendance.user_id, WEEKDAY(lessons.date)",
+                ids
+            )
+            presence: Dict[int, Dict[int, float]] = {}
+            for row in cur.fetchall():
+                presence.setdefault(row[0], {})[row[1]] = float(row[2])
+            return [(dutier, duties[dutier.id][0], duties[dutier.id][1], presence.get(dutier.id, {})) for dutier in dutiers]
+
+def save_duty_plan(schedule: Dict[datetime, List[int]]):
+    schedule = {date: user_ids for date, user_ids in schedule.items() if user_ids}
+    if not schedule:
+        return
+    
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.executemany(
+                "INSERT INTO duties (`date`, status) VALUES (?, 'undone') ON DUPLICATE KEY UPDATE id = id",
+                [(date,) for date in schedule]
+            )
+            cur.execute(
+                f"SELECT id, `date` FROM duties WHERE `date` IN ({", ".join("?" * len(schedule))})",
+                tuple(schedule)
+            )
+            duty_ids = {row[1]: row[0] for row in cur.fetchall()}
+            cur.executemany(
+                "INSERT INTO duty_assignments (duty_id, user_id) VALUES (?, ?) ON DUPLICATE KEY UPDATE id = id",
+                [(duty_ids[date], user_id) for date, user_ids in schedule.items() for user_id in user_ids]
+            )
+            conn.commit()
 
-def add_duty_photo(duty_id: int, user_id: int, blob: bytearray):
+def add_duty_photo(duty_id: int, user_id: int, sha256: str, size: int, preview_sha256: str | None, file_id: str | None = None):
     with get_conn() as conn:
         with conn.cursor() as cur:
             cur.execute(
-                "INSERT INTO duty_photos (duty_id, user_id, photo) VALUES (?, ?, ?)",
-                (duty_id, user_id, blob)
+                "INSERT INTO duty_photos (duty_id, user_id, sha256, size, preview_sha256, file_id) VALUES (?, ?, ?, ?, ?, ?)",
+                (duty_id, user_id, sha256, size, preview_sha256, file_id)
+            )
+            conn.commit()
+
+def set_duty_photo_file_id(id: int, file_id: str):
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                "UPDATE duty_photos SET file_id = ? WHERE id = ?",
+                (file_id, id)
             )
             conn.commit()
 
@@ -438,22 +749,92 @@ def get_duty_photo(id: int) -> DutyPhoto | None:
     with get_conn() as conn:
         with conn.cursor() as cur:
             cur.execute(
-                "SELECT id, duty_id, user_id, photo FROM duty_photos WHERE id = ?",
+                "SELECT id, duty_id, user_id, file_id, sha256, preview_sha256 FROM duty_photos WHERE id = ?",
                 (id,)
             )
             photo = cur.fetchone()
-            return DutyPhoto(photo[0], photo[1], photo[2], photo[3]) if photo else None
+            return DutyPhoto(*photo) if photo else None
+
+PHOTO_CHUNK_SIZE = int(os.getenv("PHOTO_CHUNK_SIZE", str(256 * 1024)))
+
+class LegacyPhotoReader(io.RawIOBase):
+    def __init__(self, id: int, chunk_size: int = PHOTO_CHUNK_SIZE):
+        self.id = id
+        self.chunk_size = chunk_size
+        self.position = 1
+        self.conn = get_conn()
+        self.cur = self.conn.cursor()
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        self.cur.execute(
+            "SELECT SUBSTRING(photo, ?, ?) FROM duty_photos WHERE id = ?",
+            (self.position, min(len(buffer), self.chunk_size), self.id)
+        )
+        row = self.cur.fetchone()
+        chunk = row[0] if row and row[0] else b""
+        buffer[:len(chunk)] = chunk
+        self.position += len(chunk)
+        return len(chunk)
+
+    def readall(self) -> bytes:
+        return b"".join(iter(lambda: self.read(self.chunk_size), b""))
+
+    def close(self):
+        if not self.closed:
+            self.cur.close()
+            self.conn.close()
+        super().close()
+
+def read_legacy_photo(id: int) -> bytes:
+    with LegacyPhotoReader(id) as reader:
+        return reader.readall()
+
+def get_legacy_photo_ids(limit: int) -> List[int]:
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT id FROM duty_photos WHERE sha256 IS NULL AND photo IS NOT NULL ORDER BY id LIMIT ?",
+                (limit,)
+            )
+            return [row[0] for row in cur.fetchall()]
+
+def get_unprocessed_photos(after_id: int, limit: int) -> List[Tuple[int, str]]:
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT id, sha256 FROM duty_photos WHERE id > ? AND sha256 IS NOT NULL AND preview_sha256 IS NULL ORDER BY id LIMIT ?",
+                (after_id, limit)
+            )
+            return cur.fetchall()
+
+def set_duty_photo_blob(id: int, sha256: str, size: int, preview_sha256: str | None = None):
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                "UPDATE duty_photos SET sha256 = ?, size = ?, preview_sha256 = ?, photo = NULL WHERE id = ?",
+                (sha256, size, preview_sha256, id)
+            )
+            conn.commit()
+
+def is_blob_referenced(sha256: str) -> bool:
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT EXISTS (SELECT 1 FROM duty_photos WHERE sha256 = ? OR preview_sha256 = ?)",
+                (sha256, sha256)
+            )
+            return bool(cur.fetchone()[0])
         
 
 
 def add_group(telegram_id: int):
-    if telegram_id in get_groups():
-        return
-    
     with get_conn() as conn:
         with conn.cursor() as cur:
             cur.execute(
-                "INSERT INTO groups (telegram_id) VALUES (?)",
+                "INSERT INTO groups (telegram_id) VALUES (?) ON DUPLICATE KEY UPDATE id = id",
                 (telegram_id,)
             )
             conn.commit()
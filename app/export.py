@@ -0,0 +1,26 @@
+import db
+from datetime import datetime
+from itertools import groupby
+from openpyxl import Workbook
+from typing import BinaryIO
+
+
+
+STATUSES = {"present": "Є", "formal_present": "Ф", "unpresent": "Н"}
+
+def write_attendance(start: datetime, end: datetime, file: BinaryIO):
+    lessons = db.get_lessons_between(start, end)
+    columns = {lesson.id: i for i, lesson in enumerate(lessons)}
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Відвідуваність")
+    sheet.append(["Прізвище"] + [f"{lesson.date.strftime("%d.%m.%Y")} {lesson.index}. {lesson.subject.name}" for lesson in lessons])
+
+    for (_, surname), rows in groupby(db.iter_attendance_between(start, end), key=lambda row: (row[0], row[1])):
+        line = [None] * len(lessons)
+        for row in rows:
+            if row[2] in columns:
+                line[columns[row[2]]] = STATUSES.get(row[3], row[3])
+        sheet.append([surname] + line)
+
+    workbook.save(file)
@@ -0,0 +1,166 @@
+import argparse, asyncio, os, random, statistics, tempfile, time, db, migrate
+from datetime import date
+from typing import Dict, List
+from telegram import Update
+from telegram.ext import Application
+from bench import TELEGRAM_ID_BASE, percentile, require_bench_database, seed
+from botstub import BotApiStub, StubRequest, serve
+from main import build_app
+
+
+
+class Updates:
+    def __init__(self, chat_id: int):
+        self.chat_id = chat_id
+        self.user = {"id": chat_id, "is_bot": False, "first_name": f"User{chat_id}"}
+        self.chat = {"id": chat_id, "type": "private"}
+        self.message_id = 0
+
+    def next_message_id(self) -> int:
+        self.message_id += 1
+        return self.message_id
+
+    def base_message(self) -> Dict:
+        return {"message_id": self.next_message_id(), "date": int(time.time()), "chat": self.chat, "from": self.user}
+
+    def text(self, text: str) -> Dict:
+        message = self.base_message() | {"text": text}
+        if text.startswith("/"):
+            message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+        return {"message": message}
+
+    def photo(self) -> Dict:
+        return {"message": self.base_message() | {"photo": [{"file_id": f"photo-{self.chat_id}", "file_unique_id": f"photo-{self.chat_id}", "width": 1280, "height": 960}]}}
+
+    def callback(self, data: str) -> Dict:
+        return {
+            "callback_query": {
+                "id": f"{self.chat_id}-{self.next_message_id()}",
+                "from": self.user,
+                "chat_instance": str(self.chat_id),
+                "data": data,
+                "message": {"message_id": 1, "date": int(time.time()), "chat": self.chat, "from": {"id": 1, "is_bot": True, "first_name": "Stub"}, "text": "..."}
+            }
+        }
+
+
+
+def get_script(updates: Updates, day: date, lesson_ids: List[int], users: int, toggles: int, rng: random.Random) -> List[Dict]:
+    script = [
+        updates.text("/home"), updates.callback("Admin"), updates.callback("Lessons"), updates.text(day.strftime("%d.%m.%Y"))
+    ]
+    if lesson_ids:
+        script += [updates.callback(str(rng.choice(lesson_ids))), updates.callback("Attendance")]
+        script += [updates.callback(str(rng.randint(1, users))) for _ in range(toggles)]
+    script += [
+        updates.text("/home"), updates.callback("MyAttendance"), updates.text(day.strftime("%d.%m.%Y")),
+        updates.callback("Previous"), updates.callback("Previous"), updates.callback("Next"),
+        updates.text("/home"), updates.callback("DutyHistory"), updates.text(day.strftime("%d.%m.%Y")),
+        updates.callback("Previous"), updates.callback("Next"),
+        updates.text("/home"), updates.callback("SaveDutyPhoto"), updates.photo()
+    ]
+    return script
+
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.lags: List[float] = []
+        self.processed = 0
+
+    def record(self, state: str, latency: float):
+        self.latencies.setdefault(state, []).append(latency)
+        self.processed += 1
+
+    async def monitor_loop(self, interval: float = 0.01):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(interval)
+            self.lags.append((loop.time() - started - interval) * 1000)
+
+
+
+async def run_chat(app: Application, recorder: Recorder, script: List[Dict], update_ids):
+    for data in script:
+        update = Update.de_json(data | {"update_id": next(update_ids)}, app.bot)
+        state = app.chat_data.get(update.effective_chat.id, {}).get("STATE")
+        state = type(state).__name__ if state else "None"
+        if update.message and update.message.text and update.message.text.startswith("/"):
+            state = update.message.text
+        started = time.perf_counter()
+        await app.update_processor.process_update(update, app.process_update(update))
+        recorder.record(state, (time.perf_counter() - started) * 1000)
+
+async def run(args):
+    rng = random.Random(args.seed)
+    if not args.no_seed:
+        migrate.migrate()
+        info = seed(args.chats, args.days, args.lessons_per_day, args.duty_size, 0, 0, rng)
+        day = info["workdays"][-1]
+        with db.connect() as conn:
+            with conn.cursor() as cur:
+                cur.executemany("INSERT INTO roles (user_id, role) VALUES (?, 'admin')", [(i,) for i in range(2, args.chats + 1)])
+                conn.commit()
+    else:
+        day = date.today()
+
+    lesson_ids = [lesson.id for lesson in db.get_lessons_by_date(day)]
+
+    stub = BotApiStub()
+    server = serve(stub, port=0)
+    os.environ["BOT_FILE_URL"] = f"http://127.0.0.1:{server.server_port}/file/bot"
+    app = build_app(StubRequest(stub), persistent=False)
+    recorder = Recorder()
+    update_ids = iter(range(1, 1 << 62))
+    scripts = [get_script(Updates(TELEGRAM_ID_BASE + i), day, lesson_ids, args.chats, args.toggles, rng) for i in range(1, args.chats + 1)]
+
+    async with app:
+        monitor = asyncio.create_task(recorder.monitor_loop())
+        semaphore = asyncio.Semaphore(args.concurrency)
+
+        async def limited(script):
+            async with semaphore:
+                await run_chat(app, recorder, script, update_ids)
+
+        started = time.perf_counter()
+        await asyncio.gather(*[limited(script) for script in scripts])
+        elapsed = time.perf_counter() - started
+        monitor.cancel()
+    server.shutdown()
+
+    print(f"Chats: {args.chats}, updates: {recorder.processed}, elapsed: {elapsed:.1f}s, updates/sec: {recorder.processed / elapsed:.1f}")
+    print(f"Event loop lag ms: p50={percentile(recorder.lags, 50):.1f} p99={percentile(recorder.lags, 99):.1f} max={max(recorder.lags):.1f}")
+    print(f"{"state":<24}{"count":>8}{"p50 ms":>10}{"p90 ms":>10}{"p99 ms":>10}{"mean ms":>10}")
+    for state, latencies in sorted(recorder.latencies.items(), key=lambda item: -statistics.mean(item[1])):
+        print(f"{state:<24}{len(latencies):>8}{percentile(latencies, 50):>10.1f}{percentile(latencies, 90):>10.1f}{percentile(latencies, 99):>10.1f}{statistics.mean(latencies):>10.1f}")
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drives the bot's Application with synthetic updates against a stub Bot API and the benchmark MariaDB (see the bench profile in docker-compose.yml, all existing rows are deleted unless --no-seed)")
+    parser.add_argument("--chats", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=200, help="chats sending updates at the same time")
+    parser.add_argument("--toggles", type=int, default=5, help="attendance toggles per chat")
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--lessons-per-day", type=int, default=4)
+    parser.add_argument("--duty-size", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--no-seed", action="store_true", help="use the data already in the database")
+    parser.add_argument("--yes", action="store_true", help="do not ask before wiping the database")
+    args = parser.parse_args()
+
+    require_bench_database()
+    if not args.no_seed and not args.yes and input(f"All data in database '{os.getenv("MARIADB_DATABASE")}' will be deleted. Continue? [y/N] ").lower() != "y":
+        return
+
+    os.environ.setdefault("TOKEN", "1:stub")
+    with tempfile.TemporaryDirectory(prefix="loadtest-photos-") as photos:
+        os.environ["PHOTO_STORE_PATH"] = photos
+        asyncio.run(run(args))
+
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,11 @@
 from telegram import Update
+from telegram.request import BaseRequest
 from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, ChatMemberHandler, filters, ContextTypes
 from states import State, Home, Registration
 from dotenv import load_dotenv
-import os, db
+from processor import ChatOrderedUpdateProcessor
+from persistence import BatchedPicklePersistence
+import os, sys, threading, adb, metrics, migrate, migrate_photos
 
 
 
@@ -19,10 +22,12 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def register(update: Update, context: ContextTypes.DEFAULT_TYPE):
     state = Registration()
     context.chat_data["STATE"] = state
+    metrics.state.set(type(state).__name__)
     next_state = await state.on_enter(update, context)
     while next_state is not None:
         state = next_state
         context.chat_data["STATE"] = state
+        metrics.state.set(type(state).__name__)
         next_state: State = await state.on_enter(update, context)
 
 
@@ -30,10 +35,12 @@ async def register(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def home(update: Update, context: ContextTypes.DEFAULT_TYPE):
     state = Home()
     context.chat_data["STATE"] = state
+    metrics.state.set(type(state).__name__)
     next_state = await state.on_enter(update, context)
     while next_state is not None:
         state = next_state
         context.chat_data["STATE"] = state
+        metrics.state.set(type(state).__name__)
         next_state = await state.on_enter(update, context)
 
 
@@ -41,10 +48,12 @@ async def home(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if "STATE" in context.chat_data:
         state: State = context.chat_data["STATE"]
+        metrics.state.set(type(state).__name__)
         next_state: State = await state.on_message(update, context)
         while next_state is not None:
             state = next_state
             context.chat_data["STATE"] = state
+            metrics.state.set(type(state).__name__)
             next_state: State = await state.on_enter(update, context)
     else:
         await update.message.reply_text("Щось пішло не так. Спробуй перейти на головну /home")
@@ -54,16 +63,32 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if "STATE" in context.chat_data:
         state: State = context.chat_data["STATE"]
+        metrics.state.set(type(state).__name__)
         next_state: State = await state.on_callback(update, context)
         while next_state is not None:
             state = next_state
             context.chat_data["STATE"] = state
+            metrics.state.set(type(state).__name__)
             next_state: State = await state.on_enter(update, context)
     else:
         await context.bot.send_message(update.effective_chat.id, "Щось пішло не так. Спробуй перейти на головну /home")
 
 
 
+async def show_metrics(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user = await adb.get_user_by_telegram(update.effective_user.id)
+    if not user or "admin" not in user.roles:
+        return
+    
+    if context.args and context.args[0] == "reset":
+        metrics.reset()
+        await update.message.reply_text("Метрики скинуто")
+        return
+    
+    await update.message.reply_text(metrics.dump()[:4000])
+
+
+
 async def group(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if update.my_chat_member:
         new_status = update.my_chat_member.new_chat_member.status
@@ -71,22 +96,69 @@ async def group(update: Update, context: ContextTypes.DEFAULT_TYPE):
         chat = update.my_chat_member.chat
 
         if old_status in ["left", "kicked"] and new_status in ["member", "administrator"]:
-            db.add_group(chat.id)
+            await adb.add_group(chat.id)
 
         elif old_status in ["member", "administrator"] and new_status in ["left", "kicked"]:
-            db.remove_group(chat.id)
+            await adb.remove_group(chat.id)
 
 
 
-if __name__ == "__main__":
-    load_dotenv(os.getenv("ENV_FILE", ".env"))
+TELEGRAM_API_URL = "https://api.telegram.org/bot"
+
+def build_app(request: BaseRequest | None = None, persistent: bool = True) -> Application:
+    builder = (
+        Application.builder()
+        .token(os.getenv("TOKEN"))
+        .base_url(os.getenv("BOT_API_URL", TELEGRAM_API_URL))
+        .base_file_url(os.getenv("BOT_FILE_URL", "https://api.telegram.org/file/bot"))
+        .concurrent_updates(ChatOrderedUpdateProcessor(int(os.getenv("CONCURRENT_UPDATES", "32"))))
+    )
+
+    if persistent:
+        builder.persistence(BatchedPicklePersistence(
+            os.getenv("PERSISTENCE_FILE", "state.pickle"),
+            update_interval=float(os.getenv("PERSISTENCE_INTERVAL", "30"))
+        ))
 
-    app = Application.builder().token(os.getenv("TOKEN")).build()
+    if request:
+        builder.request(request).get_updates_request(request)
+
+    app = builder.build()
 
     app.add_handler(CommandHandler("home", home, filters.ChatType.PRIVATE))
     app.add_handler(CommandHandler("register", register, filters.ChatType.PRIVATE))
     app.add_handler(CommandHandler("start", start, filters.ChatType.PRIVATE))
+    app.add_handler(CommandHandler("metrics", show_metrics, filters.ChatType.PRIVATE))
     app.add_handler(MessageHandler(filters.ChatType.PRIVATE, handle_message))
     app.add_handler(CallbackQueryHandler(handle_callback))
     app.add_handler(ChatMemberHandler(group))
-    app.run_polling()
\ No newline at end of file
+    return app
+
+
+
+if __name__ == "__main__":
+    load_dotenv(os.getenv("ENV_FILE", ".env"))
+    webhook = os.getenv("BOT_MODE", "polling") == "webhook"
+    if webhook and not os.getenv("WEBHOOK_SECRET"):
+        print("WEBHOOK_SECRET must be set when BOT_MODE=webhook")
+        sys.exit(1)
+
+    # against the real Bot API setWebhook needs a public URL; a stub (see replay.py) does not care
+    if webhook and not os.getenv("WEBHOOK_URL") and os.getenv("BOT_API_URL", TELEGRAM_API_URL) == TELEGRAM_API_URL:
+        print("WEBHOOK_URL must be set when BOT_MODE=webhook")
+        sys.exit(1)
+
+    migrate.migrate()
+    threading.Thread(target=migrate_photos.run, daemon=True).start()
+
+    app = build_app()
+    if webhook:
+        app.run_webhook(
+            listen=os.getenv("WEBHOOK_LISTEN", "0.0.0.0"),
+            port=int(os.getenv("WEBHOOK_PORT", "8443")),
+            url_path=os.getenv("WEBHOOK_PATH", "webhook"),
+            webhook_url=os.getenv("WEBHOOK_URL"),
+            secret_token=os.getenv("WEBHOOK_SECRET")
+        )
+    else:
+        app.run_polling()
@@ -0,0 +1,117 @@
+import contextvars, os, threading, time
+from collections import deque
+from typing import Dict, List, Tuple
+
+
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "100"))
+BUCKETS = 16
+
+operation = contextvars.ContextVar("operation", default="-")
+state = contextvars.ContextVar("state", default="-")
+
+
+
+class Histogram:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.buckets = [0] * BUCKETS
+
+    def add(self, ms: float):
+        self.count += 1
+        self.total += ms
+        self.buckets[min(BUCKETS - 1, max(0, int(ms).bit_length()))] += 1
+
+    def percentile(self, percent: float) -> float:
+        target = self.count * percent / 100
+        seen = 0
+        for i, amount in enumerate(self.buckets):
+            seen += amount
+            if seen >= target:
+                return float(1 << i)
+        return float(1 << (BUCKETS - 1))
+
+histograms: Dict[Tuple[str, str], Histogram] = {}
+slow_queries: deque = deque(maxlen=int(os.getenv("SLOW_QUERY_SAMPLES", "20")))
+lock = threading.Lock()
+
+def record(sql: str, ms: float):
+    keys = [("operation", operation.get()), ("state", state.get())]
+    with lock:
+        for key in keys:
+            histograms.setdefault(key, Histogram()).add(ms)
+        if ms >= SLOW_QUERY_MS:
+            slow_queries.append((time.strftime("%H:%M:%S"), keys[0][1], keys[1][1], ms, " ".join(sql.split())[:200]))
+
+def count() -> int:
+    with lock:
+        return sum(histogram.count for key, histogram in histograms.items() if key[0] == "operation")
+
+def reset():
+    with lock:
+        histograms.clear()
+        slow_queries.clear()
+
+def dump(limit: int = 10) -> str:
+    with lock:
+        lines = []
+        for kind in ["operation", "state"]:
+            rows = sorted(((key[1], histogram) for key, histogram in histograms.items() if key[0] == kind), key=lambda row: -row[1].total)
+            lines.append(f"By {kind} (queries, total ms, avg ms, p95 ms <=):")
+            lines += [
+                f"{name}: {histogram.count}, {histogram.total:.0f}, {histogram.total / histogram.count:.1f}, {histogram.percentile(95):.0f}"
+                for name, histogram in rows[:limit]
+            ]
+        lines.append(f"Slow queries (>= {SLOW_QUERY_MS:.0f} ms):")
+        lines += [f"{at} {name} / {state_name} {ms:.0f} ms: {sql}" for at, name, state_name, ms, sql in slow_queries]
+        return "\n".join(lines)
+
+
+
+class Cursor:
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    def timed(self, method, sql: str, *args):
+        started = time.perf_counter()
+        try:
+            return method(sql, *args)
+        finally:
+            record(sql, (time.perf_counter() - started) * 1000)
+
+    def execute(self, sql: str, *args):
+        return self.timed(self.cursor.execute, sql, *args)
+
+    def executemany(self, sql: str, *args):
+        return self.timed(self.cursor.executemany, sql, *args)
+
+    def __iter__(self):
+        return iter(self.cursor)
+
+    def __getattr__(self, name: str):
+        return getattr(self.cursor, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cursor.close()
+
+
+
+class Connection:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def cursor(self, *args, **kwargs) -> Cursor:
+        return Cursor(self.conn.cursor(*args, **kwargs))
+
+    def __getattr__(self, name: str):
+        return getattr(self.conn, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.conn.close()
@@ -0,0 +1,45 @@
+import os, db
+
+
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+
+def get_migrations() -> list[tuple[str, str]]:
+    return [
+        (name.removesuffix(".sql"), os.path.join(MIGRATIONS_DIR, name))
+        for name in sorted(os.listdir(MIGRATIONS_DIR)) if name.endswith(".sql")
+    ]
+
+def split_statements(sql: str) -> list[str]:
+    return [statement.strip() for statement in sql.split(";\n") if statement.strip().rstrip(";")]
+
+def migrate():
+    with db.connect() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                "CREATE TABLE IF NOT EXISTS `schema_migrations` (\n" \
+                "`version` varchar(255) PRIMARY KEY,\n" \
+                "`applied_at` datetime NOT NULL DEFAULT CURRENT_TIMESTAMP\n" \
+                ")"
+            )
+            cur.execute("SELECT version FROM schema_migrations")
+            applied = {row[0] for row in cur.fetchall()}
+
+            for version, path in get_migrations():
+                if version in applied:
+                    continue
+
+                with open(path, encoding="utf-8") as file:
+                    for statement in split_statements(file.read()):
+                        cur.execute(statement.rstrip(";"))
+                cur.execute(
+                    "INSERT INTO schema_migrations (version) VALUES (?)",
+                    (version,)
+                )
+                conn.commit()
+                print(f"Applied migration {version}")
+
+
+
+if __name__ == "__main__":
+    migrate()
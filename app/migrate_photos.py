@@ -0,0 +1,58 @@
+import os, time, blobstore, db, photos
+
+
+
+BATCH_SIZE = int(os.getenv("PHOTO_MIGRATION_BATCH", "20"))
+GC_INTERVAL = float(os.getenv("PHOTO_GC_INTERVAL", "3600"))
+
+def migrate_photos() -> int:
+    moved = 0
+    while ids := db.get_legacy_photo_ids(BATCH_SIZE):
+        for id in ids:
+            with db.LegacyPhotoReader(id) as reader:
+                sha256, size = blobstore.put(reader)
+            db.set_duty_photo_blob(id, sha256, size)
+            moved += 1
+        print(f"Moved {moved} duty photos to the blob store")
+
+    if moved:
+        with db.get_conn() as conn:
+            with conn.cursor() as cur:
+                cur.execute("OPTIMIZE TABLE duty_photos")
+                cur.fetchall()
+    return moved
+
+def recompress_photos() -> int:
+    processed = 0
+    last_id = 0
+    while rows := db.get_unprocessed_photos(last_id, BATCH_SIZE):
+        futures = [(id, sha256, photos.get_pool().submit(photos.process, sha256)) for id, sha256 in rows]
+        for id, sha256, future in futures:
+            last_id = id
+            try:
+                archive, size, preview = future.result()
+            except Exception as error:
+                print(f"Could not recompress duty photo {id}: {error!r}")
+                continue
+            db.set_duty_photo_blob(id, archive, size, preview)
+            if archive != sha256:
+                photos.release(sha256)
+            processed += 1
+        print(f"Recompressed {processed} duty photos")
+    return processed
+
+def run():
+    migrate_photos()
+    recompress_photos()
+    while True:
+        removed = photos.collect_garbage()
+        if removed:
+            print(f"Removed {removed} unreferenced duty photo blobs")
+        time.sleep(GC_INTERVAL)
+
+
+
+if __name__ == "__main__":
+    migrate_photos()
+    recompress_photos()
+    print(f"Removed {photos.collect_garbage()} unreferenced duty photo blobs")
@@ -0,0 +1 @@
+ALTER TABLE `duty_photos` ADD COLUMN IF NOT EXISTS `file_id` varchar(255) AFTER `photo`;
@@ -0,0 +1,10 @@
+ALTER TABLE `lessons` ADD INDEX IF NOT EXISTS `lessons_date_index` (`date`, `index`);
+ALTER TABLE `attendance` ADD INDEX IF NOT EXISTS `attendance_lesson_user` (`lesson_id`, `user_id`);
+ALTER TABLE `attendance` ADD INDEX IF NOT EXISTS `attendance_user_status` (`user_id`, `status`);
+ALTER TABLE `duties` ADD INDEX IF NOT EXISTS `duties_date` (`date`);
+ALTER TABLE `roles` ADD INDEX IF NOT EXISTS `roles_user_role` (`user_id`, `role`);
+ALTER TABLE `roles` ADD INDEX IF NOT EXISTS `roles_role_user` (`role`, `user_id`);
+ALTER TABLE `duty_assignments` ADD INDEX IF NOT EXISTS `duty_assignments_duty_user` (`duty_id`, `user_id`);
+ALTER TABLE `duty_assignments` ADD INDEX IF NOT EXISTS `duty_assignments_user` (`user_id`);
+ALTER TABLE `groups` ADD INDEX IF NOT EXISTS `groups_telegram_id` (`telegram_id`);
+ALTER TABLE `duty_photos` ADD INDEX IF NOT EXISTS `duty_photos_duty` (`duty_id`);
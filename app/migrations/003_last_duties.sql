@@ -0,0 +1,11 @@
+CREATE TABLE IF NOT EXISTS `last_duties` (
+  `user_id` integer PRIMARY KEY,
+  `date` date NOT NULL,
+  FOREIGN KEY (user_id) REFERENCES users(id),
+  INDEX `last_duties_date` (`date`)
+);
+INSERT INTO `last_duties` (`user_id`, `date`)
+SELECT duty_assignments.user_id, MAX(duties.date) FROM duty_assignments
+JOIN duties ON duties.id = duty_assignments.duty_id AND duties.status = 'done'
+GROUP BY duty_assignments.user_id
+ON DUPLICATE KEY UPDATE `date` = VALUES(`date`);
@@ -0,0 +1,16 @@
+CREATE TABLE IF NOT EXISTS `attendance_summary` (
+  `user_id` integer NOT NULL,
+  `subject_id` integer NOT NULL,
+  `present` integer NOT NULL DEFAULT 0,
+  `formal_present` integer NOT NULL DEFAULT 0,
+  `unpresent` integer NOT NULL DEFAULT 0,
+  PRIMARY KEY (`user_id`, `subject_id`),
+  FOREIGN KEY (user_id) REFERENCES users(id),
+  FOREIGN KEY (subject_id) REFERENCES subjects(id),
+  INDEX `attendance_summary_subject` (`subject_id`)
+);
+INSERT INTO `attendance_summary` (`user_id`, `subject_id`, `present`, `formal_present`, `unpresent`)
+SELECT user_id, subject_id, SUM(status = 'present'), SUM(status = 'formal_present'), SUM(status = 'unpresent') FROM attendance
+JOIN lessons ON lessons.id = attendance.lesson_id
+GROUP BY user_id, subject_id
+ON DUPLICATE KEY UPDATE `present` = VALUES(`present`), `formal_present` = VALUES(`formal_present`), `unpresent` = VALUES(`unpresent`);
@@ -0,0 +1,4 @@
+ALTER TABLE `duty_photos` MODIFY `photo` longblob NULL;
+ALTER TABLE `duty_photos` ADD COLUMN IF NOT EXISTS `sha256` char(64) AFTER `photo`;
+ALTER TABLE `duty_photos` ADD COLUMN IF NOT EXISTS `size` integer AFTER `sha256`;
+ALTER TABLE `duty_photos` ADD INDEX IF NOT EXISTS `duty_photos_sha256` (`sha256`);
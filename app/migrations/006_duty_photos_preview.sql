@@ -0,0 +1,2 @@
+ALTER TABLE `duty_photos` ADD COLUMN IF NOT EXISTS `preview_sha256` char(64) AFTER `size`;
+ALTER TABLE `duty_photos` ADD INDEX IF NOT EXISTS `duty_photos_preview_sha256` (`preview_sha256`);
@@ -0,0 +1,46 @@
+UPDATE attendance
+JOIN lessons ON lessons.id = attendance.lesson_id
+JOIN (SELECT `date`, `index`, MIN(id) AS id FROM lessons GROUP BY `date`, `index`) kept ON kept.`date` = lessons.`date` AND kept.`index` = lessons.`index`
+SET attendance.lesson_id = kept.id
+WHERE lessons.id <> kept.id;
+DELETE lessons FROM lessons
+JOIN lessons kept ON kept.`date` = lessons.`date` AND kept.`index` = lessons.`index` AND kept.id < lessons.id;
+DELETE attendance FROM attendance
+JOIN attendance newer ON newer.lesson_id = attendance.lesson_id AND newer.user_id = attendance.user_id AND newer.id > attendance.id;
+ALTER TABLE `lessons` DROP INDEX IF EXISTS `lessons_date_index`, ADD UNIQUE INDEX `lessons_date_index` (`date`, `index`);
+ALTER TABLE `attendance` DROP INDEX IF EXISTS `attendance_lesson_user`, ADD UNIQUE INDEX `attendance_lesson_user` (`lesson_id`, `user_id`);
+DELETE FROM attendance_summary;
+INSERT INTO attendance_summary (user_id, subject_id, present, formal_present, unpresent)
+SELECT user_id, subject_id, SUM(status = 'present'), SUM(status = 'formal_present'), SUM(status = 'unpresent') FROM attendance
+JOIN lessons ON lessons.id = attendance.lesson_id
+GROUP BY user_id, subject_id;
+UPDATE duties
+JOIN (SELECT `date`, MIN(id) AS id, MIN(status) AS status FROM duties GROUP BY `date`) kept ON kept.id = duties.id
+SET duties.status = kept.status;
+UPDATE duty_assignments
+JOIN duties ON duties.id = duty_assignments.duty_id
+JOIN (SELECT `date`, MIN(id) AS id FROM duties GROUP BY `date`) kept ON kept.`date` = duties.`date`
+SET duty_assignments.duty_id = kept.id
+WHERE duties.id <> kept.id;
+UPDATE duty_photos
+JOIN duties ON duties.id = duty_photos.duty_id
+JOIN (SELECT `date`, MIN(id) AS id FROM duties GROUP BY `date`) kept ON kept.`date` = duties.`date`
+SET duty_photos.duty_id = kept.id
+WHERE duties.id <> kept.id;
+DELETE duties FROM duties
+JOIN duties kept ON kept.`date` = duties.`date` AND kept.id < duties.id;
+DELETE duty_assignments FROM duty_assignments
+JOIN duty_assignments kept ON kept.duty_id = duty_assignments.duty_id AND kept.user_id = duty_assignments.user_id AND kept.id < duty_assignments.id;
+ALTER TABLE `duties` DROP INDEX IF EXISTS `duties_date`, ADD UNIQUE INDEX `duties_date` (`date`);
+ALTER TABLE `duty_assignments` DROP INDEX IF EXISTS `duty_assignments_duty_user`, ADD UNIQUE INDEX `duty_assignments_duty_user` (`duty_id`, `user_id`);
+DELETE FROM last_duties;
+INSERT INTO last_duties (user_id, `date`)
+SELECT duty_assignments.user_id, MAX(duties.date) FROM duty_assignments
+JOIN duties ON duties.id = duty_assignments.duty_id AND duties.status = 'done'
+GROUP BY duty_assignments.user_id;
+DELETE roles FROM roles
+JOIN roles kept ON kept.user_id = roles.user_id AND kept.role = roles.role AND kept.id < roles.id;
+ALTER TABLE `roles` DROP INDEX IF EXISTS `roles_user_role`, ADD UNIQUE INDEX `roles_user_role` (`user_id`, `role`);
+DELETE `groups` FROM `groups`
+JOIN `groups` kept ON kept.telegram_id = `groups`.telegram_id AND kept.id < `groups`.id;
+ALTER TABLE `groups` DROP INDEX IF EXISTS `groups_telegram_id`, ADD UNIQUE INDEX `groups_telegram_id` (`telegram_id`);
@@ -0,0 +1,55 @@
+import asyncio, os, pickle
+from telegram.ext import PicklePersistence, PersistenceInput
+
+
+
+class BatchedPicklePersistence(PicklePersistence):
+    # with on_flush=True PicklePersistence only updates its in-memory copy; the file is written here
+    # once per persistence cycle, in a worker thread, however many chats changed
+    def __init__(self, filepath: str, update_interval: float):
+        super().__init__(
+            filepath,
+            store_data=PersistenceInput(bot_data=False, user_data=False, callback_data=False),
+            on_flush=True,
+            update_interval=update_interval
+        )
+        self.dirty = False
+        self.writer: asyncio.Task | None = None
+
+    def snapshot(self) -> dict:
+        return {
+            "conversations": dict(self.conversations or {}),
+            "user_data": {},
+            "chat_data": {chat_id: dict(data) for chat_id, data in (self.chat_data or {}).items()},
+            "bot_data": {},
+            "callback_data": None
+        }
+
+    def dump(self, data: dict):
+        tmp = f"{self.filepath}.tmp"
+        with open(tmp, "wb") as file:
+            pickle.dump(data, file)
+        os.replace(tmp, self.filepath)
+
+    async def write(self):
+        while self.dirty:
+            self.dirty = False
+            await asyncio.to_thread(self.dump, self.snapshot())
+
+    def schedule_write(self):
+        self.dirty = True
+        if not self.writer or self.writer.done():
+            self.writer = asyncio.create_task(self.write())
+
+    async def update_chat_data(self, chat_id: int, data: dict):
+        await super().update_chat_data(chat_id, data)
+        self.schedule_write()
+
+    async def drop_chat_data(self, chat_id: int):
+        await super().drop_chat_data(chat_id)
+        self.schedule_write()
+
+    async def flush(self):
+        if self.writer:
+            await self.writer
+        self.dump(self.snapshot())
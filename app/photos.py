@@ -0,0 +1,72 @@
+import asyncio, multiprocessing, os, blobstore, db
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from typing import Tuple
+from PIL import Image, ImageOps
+
+
+
+ARCHIVE_SIZE = int(os.getenv("PHOTO_ARCHIVE_SIZE", "1600"))
+ARCHIVE_QUALITY = int(os.getenv("PHOTO_ARCHIVE_QUALITY", "85"))
+PREVIEW_SIZE = int(os.getenv("PHOTO_PREVIEW_SIZE", "320"))
+PREVIEW_QUALITY = int(os.getenv("PHOTO_PREVIEW_QUALITY", "70"))
+PHOTO_WORKERS = int(os.getenv("PHOTO_WORKERS", "2"))
+BLOB_GRACE = float(os.getenv("PHOTO_BLOB_GRACE", "3600"))
+
+
+
+def encode(image: Image.Image, size: int, quality: int) -> BytesIO:
+    image = image.copy()
+    image.thumbnail((size, size))
+    out = BytesIO()
+    image.save(out, "JPEG", quality=quality, optimize=True, progressive=True)
+    out.seek(0)
+    return out
+
+def process(key: str) -> Tuple[str, int, str | None]:
+    # runs in a worker process, returns (archive key, archive size, preview key)
+    with blobstore.get_store().open(key) as file:
+        original_size = file.seek(0, os.SEEK_END)
+        file.seek(0)
+        try:
+            image = Image.open(file)
+            image.load()
+            keep_original = image.format == "JPEG" and max(image.size) <= ARCHIVE_SIZE
+            image = ImageOps.exif_transpose(image).convert("RGB")
+        except (OSError, Image.DecompressionBombError):
+            return key, original_size, None
+
+    archive = encode(image, ARCHIVE_SIZE, ARCHIVE_QUALITY)
+    if keep_original and archive.getbuffer().nbytes >= original_size:
+        archive_key, archive_size = key, original_size
+    else:
+        archive_key, archive_size = blobstore.put(archive)
+
+    preview_key, _ = blobstore.put(encode(image, PREVIEW_SIZE, PREVIEW_QUALITY))
+    return archive_key, archive_size, preview_key
+
+def release(key: str) -> bool:
+    # a put of the same content refreshes the blob's age under the same lock, so a blob younger than
+    # BLOB_GRACE may belong to an upload that is not in the database yet
+    store = blobstore.get_store()
+    with store.lock():
+        if store.exists(key) and store.age(key) > BLOB_GRACE and not db.is_blob_referenced(key):
+            store.delete(key)
+            return True
+        return False
+
+def collect_garbage() -> int:
+    return sum(release(key) for key in blobstore.get_store().keys())
+
+
+
+pool: ProcessPoolExecutor | None = None
+
+def get_pool() -> ProcessPoolExecutor:
+    global pool
+    if pool is None:
+        pool = ProcessPoolExecutor(PHOTO_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return pool
+
+async def process_in_pool(key: str) -> Tuple[str, int, str | None]:
+    return await asyncio.get_running_loop().run_in_executor(get_pool(), process, key)
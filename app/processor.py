@@ -0,0 +1,42 @@
+import asyncio
+from typing import Awaitable, Dict
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(max_concurrent_updates)
+        self.slots = asyncio.BoundedSemaphore(max_concurrent_updates)
+        self.locks: Dict[int, asyncio.Lock] = {}
+        self.waiting: Dict[int, int] = {}
+
+    async def process_update(self, update: object, coroutine: Awaitable):
+        # the chat lock is taken before a slot, so updates queued behind their own chat don't hold slots
+        chat = update.effective_chat if isinstance(update, Update) else None
+        if not chat:
+            async with self.slots:
+                await self.do_process_update(update, coroutine)
+            return
+
+        lock = self.locks.setdefault(chat.id, asyncio.Lock())
+        self.waiting[chat.id] = self.waiting.get(chat.id, 0) + 1
+        try:
+            async with lock:
+                async with self.slots:
+                    await self.do_process_update(update, coroutine)
+        finally:
+            self.waiting[chat.id] -= 1
+            if not self.waiting[chat.id]:
+                del self.waiting[chat.id]
+                del self.locks[chat.id]
+
+    async def do_process_update(self, update: object, coroutine: Awaitable):
+        await coroutine
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
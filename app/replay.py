@@ -0,0 +1,67 @@
+import argparse, json, statistics, time
+import httpx
+from botstub import BotApiStub, serve
+
+
+
+def get_chat_id(update: dict) -> int | None:
+    for key in ["message", "edited_message", "callback_query", "my_chat_member"]:
+        if key in update:
+            payload = update[key]
+            if key == "callback_query":
+                payload = payload.get("message", {})
+            return payload.get("chat", {}).get("id")
+    return None
+
+def percentile(values: list[float], percent: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replays recorded Update JSON against the bot and measures update-to-reply latency")
+    parser.add_argument("updates", help="file with one Update JSON object per line")
+    parser.add_argument("--mode", choices=["webhook", "polling"], default="webhook")
+    parser.add_argument("--webhook-url", default="http://127.0.0.1:8443/webhook")
+    parser.add_argument("--secret", default=None)
+    parser.add_argument("--stub-host", default="127.0.0.1")
+    parser.add_argument("--stub-port", type=int, default=8081)
+    parser.add_argument("--timeout", type=float, default=10)
+    args = parser.parse_args()
+
+    stub = BotApiStub()
+    serve(stub, args.stub_host, args.stub_port)
+    print(f"Bot API stub listening, start the bot with BOT_API_URL=http://{args.stub_host}:{args.stub_port}/bot and BOT_MODE={args.mode}")
+    input("Press Enter when the bot is running...")
+
+    with open(args.updates, encoding="utf-8") as file:
+        updates = [json.loads(line) for line in file if line.strip()]
+
+    headers = {"X-Telegram-Bot-Api-Secret-Token": args.secret} if args.secret else {}
+    latencies = []
+    unanswered = 0
+    with httpx.Client() as client:
+        for update_id, update in enumerate(updates, start=1):
+            update["update_id"] = update_id
+            chat_id = get_chat_id(update)
+            sent = time.monotonic()
+            if args.mode == "webhook":
+                client.post(args.webhook_url, json=update, headers=headers).raise_for_status()
+            else:
+                stub.push_update(update)
+
+            call = stub.wait_for_call(chat_id, sent, args.timeout) if chat_id else None
+            if call:
+                latencies.append((call["time"] - sent) * 1000)
+            else:
+                unanswered += 1
+
+    print(f"Updates: {len(updates)}, answered: {len(latencies)}, unanswered: {unanswered}")
+    if latencies:
+        print(f"Latency ms: p50={percentile(latencies, 50):.1f} p90={percentile(latencies, 90):.1f} p99={percentile(latencies, 99):.1f} max={max(latencies):.1f} mean={statistics.mean(latencies):.1f}")
+
+
+
+if __name__ == "__main__":
+    main()
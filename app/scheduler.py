@@ -0,0 +1,59 @@
+import heapq, os, db
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from typing import Dict, List
+
+
+
+MIN_PRESENCE = float(os.getenv("SCHEDULER_MIN_PRESENCE", "0.5"))
+
+
+
+@dataclass(order=True)
+class Candidate:
+    duties: int
+    last_duty: date
+    surname: str
+    user: db.User = field(compare=False)
+    presence: Dict[int, float] = field(compare=False, default_factory=dict)
+
+    def is_available(self, day: date) -> bool:
+        return self.presence.get(day.weekday(), 1.0) >= MIN_PRESENCE
+
+
+
+def get_workdays(start: date, days: int) -> List[date]:
+    return [start + timedelta(days=i) for i in range(days) if (start + timedelta(days=i)).weekday() < 5]
+
+def plan(candidates: List[Candidate], dates: List[date], per_day: int) -> Dict[date, List[db.User]]:
+    heap = list(candidates)
+    heapq.heapify(heap)
+    schedule = {}
+    for day in dates:
+        chosen: List[Candidate] = []
+        skipped: List[Candidate] = []
+        while heap and len(chosen) < per_day:
+            candidate = heapq.heappop(heap)
+            (chosen if candidate.is_available(day) else skipped).append(candidate)
+
+        schedule[day] = [candidate.user for candidate in chosen]
+        for candidate in chosen:
+            candidate.duties += 1
+            candidate.last_duty = day
+        for candidate in chosen + skipped:
+            heapq.heappush(heap, candidate)
+    return schedule
+
+
+
+def plan_duties(start: date, days: int, per_day: int) -> Dict[date, List[db.User]]:
+    dates = get_workdays(start, days)
+    if not dates:
+        return {}
+
+    taken = {duty.date for duty in db.get_duties_between(dates[0], dates[-1])}
+    candidates = [
+        Candidate(duties, last_duty or date.min, user.surname, user, presence)
+        for user, duties, last_duty, presence in db.get_rotation_stats()
+    ]
+    return plan(candidates, [day for day in dates if day not in taken], per_day)
@@ -2,8 +2,8 @@ from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 from dataclasses import dataclass, field
 from datetime import datetime, timedelta
-from typing import Dict, List, Tuple
-import db, io
+from typing import Awaitable, Callable, Dict, List, Tuple
+import asyncio, db, adb, broadcast, httpx, io, os, photos, tempfile, time
 
 DATE_FORMAT = "Формат дати: ДД.ММ.РРРР"
 
@@ -16,6 +16,54 @@ def StrToDate(str: str):
 
 
 
+WINDOW_DAYS = int(os.getenv("WINDOW_DAYS", "3"))
+WINDOW_TTL = float(os.getenv("WINDOW_TTL", "60"))
+windows: Dict[Tuple[int, str], Tuple[float, datetime, datetime, List]] = {}
+
+async def get_window(update: Update, kind: str, date: datetime, loader: Callable[[datetime, datetime], Awaitable[List]]) -> List:
+    now = time.monotonic()
+    key = (update.effective_chat.id, kind)
+    entry = windows.get(key)
+    if not entry or now - entry[0] > WINDOW_TTL or not entry[1] <= date <= entry[2]:
+        for expired in [cached_key for cached_key, cached in windows.items() if now - cached[0] > WINDOW_TTL]:
+            del windows[expired]
+        start, end = date - timedelta(days=WINDOW_DAYS), date + timedelta(days=WINDOW_DAYS)
+        entry = (now, start, end, await loader(start, end))
+        windows[key] = entry
+    return entry[3]
+
+def drop_windows(*kinds: str):
+    # windows are cached per chat but show shared data, so a write drops the kind for every chat
+    for key in [key for key in windows if key[1] in kinds]:
+        del windows[key]
+
+
+
+PHOTO_SPOOL_SIZE = int(os.getenv("PHOTO_SPOOL_SIZE", str(1024 * 1024)))
+PHOTO_DOWNLOAD_CHUNK = 64 * 1024
+ingest_slots = asyncio.Semaphore(int(os.getenv("PHOTO_INGESTS", "4")))
+http: httpx.AsyncClient | None = None
+
+async def download_to(file, out):
+    global http
+    if http is None:
+        http = httpx.AsyncClient(timeout=float(os.getenv("PHOTO_DOWNLOAD_TIMEOUT", "60")))
+    async with http.stream("GET", file.file_path) as response:
+        response.raise_for_status()
+        async for chunk in response.aiter_bytes(PHOTO_DOWNLOAD_CHUNK):
+            out.write(chunk)
+
+async def ingest_photo(file) -> Tuple[str, int, str | None]:
+    async with ingest_slots:
+        with tempfile.SpooledTemporaryFile(max_size=PHOTO_SPOOL_SIZE) as buffer:
+            await download_to(file, buffer)
+            buffer.seek(0)
+            original, _ = await adb.put_blob(buffer)
+        # a replaced original is left to the periodic blob collection once it is past the grace period
+        return await photos.process_in_pool(original)
+
+
+
 class State:
     async def on_enter(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         pass
@@ -37,7 +85,7 @@ class State:
 @dataclass
 class Registration(State):
     async def on_enter(self, update, context):
-        user = db.get_user_by_telegram(update.effective_user.id)
+        user = await adb.get_user_by_telegram(update.effective_user.id)
         if user:
             return AlreadyRegistered()
         
@@ -96,7 +144,7 @@ class RegistrationSuccess(State):
     surname: str
 
     async def on_enter(self, update, context):
-        db.add_user(self.surname, update.effective_user.id)
+        await adb.add_user(self.surname, update.effective_user.id)
         await self.__send_message__(
             update, context,
             f"Ви успішно зареєструвались як '{self.surname}'\nОчікуйте підтвердження адміністратора"
@@ -117,7 +165,7 @@ class HomeAccessDenied(State):
 @dataclass
 class Home(State):
     async def on_enter(self, update, context):
-        user = db.get_user_by_telegram(update.effective_user.id)
+        user = await adb.get_user_by_telegram(update.effective_user.id)
         if not user:
             return HomeAccessDenied()
         
@@ -170,11 +218,11 @@ class Home(State):
 @dataclass
 class SaveDutyPhoto(State):
     async def on_enter(self, update, context):
-        duty = db.get_duty_by_date(datetime.now().date())
+        duty = await adb.get_duty_by_date(datetime.now().date())
         if not duty:
             return NotADutierToday()
         
-        if db.get_user_by_telegram(update.effective_user.id) not in duty.dutiers:
+        if await adb.get_user_by_telegram(update.effective_user.id) not in duty.dutiers:
             return NotADutierToday()
         
         if duty.blob_id:
@@ -185,11 +233,11 @@ class SaveDutyPhoto(State):
     async def on_message(self, update, context):
         photo = update.message.photo
         if photo:
-            duty = db.get_duty_by_date(datetime.now().date())
-            file = await photo[-1].get_file()
-            blob = await file.download_as_bytearray()
-            db.add_duty_photo(duty.id, db.get_user_by_telegram(update.effective_user.id).id, bytes(blob))
-            db.set_duty_status(duty.id, "done")
+            duty = await adb.get_duty_by_date(datetime.now().date())
+            sha256, size, preview = await ingest_photo(await photo[-1].get_file())
+            await adb.add_duty_photo(duty.id, (await adb.get_user_by_telegram(update.effective_user.id)).id, sha256, size, preview, photo[-1].file_id)
+            await adb.set_duty_status(duty.id, "done")
+            drop_windows("duties")
             return DutyPhotoSaved()
 
 
@@ -258,7 +306,7 @@ class GetDutyPhotoDate(State):
         if text:
             date = StrToDate(text)
             if date:
-                duty = db.get_duty_by_date(date)
+                duty = await adb.get_duty_by_date(date)
                 if not duty:
                     return NoDuty()
                 
@@ -273,13 +321,39 @@ class GetDutyPhotoDate(State):
 class GetDutyPhoto(State):
     blob_id: int
 
+    async def get_caption(self, blob) -> str:
+        return f"Фото завантажив: {(await adb.get_user_by_id(blob.user_id)).surname}\nГоловна - /home"
+
+    async def send_full(self, update, blob):
+        if blob.sha256:
+            content = await adb.read_blob(blob.sha256)
+        else:
+            content = await adb.read_legacy_photo(self.blob_id)
+        message = await update.effective_message.reply_photo(io.BytesIO(content), caption=await self.get_caption(blob))
+        await adb.set_duty_photo_file_id(blob.id, message.photo[-1].file_id)
+
     async def on_enter(self, update, context):
-        blob = db.get_duty_photo(self.blob_id)
-        photo = io.BytesIO(blob.blob)
-        await update.message.reply_photo(
-            photo,
-            caption=f"Фото завантажив: {db.get_user_by_id(blob.user_id).surname}\nГоловна - /home"
-        )
+        blob = await adb.get_duty_photo(self.blob_id)
+        if blob.file_id:
+            await update.message.reply_photo(blob.file_id, caption=await self.get_caption(blob))
+            return
+
+        if blob.preview_sha256:
+            await update.message.reply_photo(
+                io.BytesIO(await adb.read_blob(blob.preview_sha256)),
+                caption=await self.get_caption(blob),
+                reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("Повний розмір", callback_data="Full")]])
+            )
+            return
+
+        await self.send_full(update, blob)
+
+    async def on_callback(self, update, context):
+        data = update.callback_query.data
+        await update.callback_query.answer()
+
+        if data == "Full":
+            await self.send_full(update, await adb.get_duty_photo(self.blob_id))
                 
 
 
@@ -359,7 +433,8 @@ class DutyHistory(State):
     date: datetime
 
     async def on_enter(self, update, context):
-        duty = db.get_duty_by_date(self.date)
+        duties = await get_window(update, "duties", self.date, adb.get_duties_between)
+        duty = next((duty for duty in duties if duty.date == self.date), None)
         await self.__send_message__(
             update, context,
             f"Чергові за {self.date.strftime("%d.%m.%Y")}:\n{"Немає" if not duty else "\n".join([dutier.surname for dutier in duty.dutiers])}",
@@ -431,18 +506,25 @@ class MyAttendance(State):
     date: datetime
 
     async def on_enter(self, update, context):
-        lessons = db.get_lessons_by_date(self.date)
-        user = db.get_user_by_telegram(update.effective_user.id)
+        user = await adb.get_user_by_telegram(update.effective_user.id)
+        lessons = [lesson for lesson in await get_window(update, "lessons", self.date, adb.get_lessons_between) if lesson.date == self.date]
+        attendance = {
+            att.lesson_id: att.status
+            for att in await get_window(update, "attendance", self.date, lambda start, end: adb.get_user_attendance_between(user.id, start, end))
+        }
         attendance_formated = []
         for lesson in lessons:
-            attendance = db.get_user_on_lesson_attendance(user.id, lesson.id)
-            attendance_formated.append(f"{lesson.index}. {lesson.subject.name} - {"Н" if attendance.status == "unpresent" else "Є"}")
+            status = attendance.get(lesson.id)
+            attendance_formated.append(f"{lesson.index}. {lesson.subject.name} - {"-" if not status else ("Н" if status == "unpresent" else "Є")}")
 
         await self.__send_message__(
             update, context,
             f"Твоя відвідуваність за {self.date.strftime("%d.%m.%Y")}\n{"\n".join(attendance_formated) if attendance_formated else "Пар немає"}",
             InlineKeyboardMarkup(
                 [
+                    [
+                        InlineKeyboardButton("Статистика", callback_data="Statistics")
+                    ],
                     [
                         InlineKeyboardButton("⬅️", callback_data="Previous"),
                         InlineKeyboardButton("Назад", callback_data="Back"),
@@ -462,11 +544,39 @@ class MyAttendance(State):
         elif data == "Next":
             return MyAttendance(self.date + timedelta(days=1))
         
+        elif data == "Statistics":
+            return MyStatistics(self.date)
+        
         elif data == "Back":
             return Home()
 
 
 
+@dataclass
+class MyStatistics(State):
+    date: datetime
+
+    async def on_enter(self, update, context):
+        user = await adb.get_user_by_telegram(update.effective_user.id)
+        summary = await adb.get_user_summary(user.id)
+        await self.__send_message__(
+            update, context,
+            "\n".join(
+                ["Твоя статистика (Є / Ф / Н):"]
+                +
+                [f"{row.name}: {row.present} / {row.formal_present} / {row.unpresent}" for row in summary]
+            ) if summary else "Статистики поки немає",
+            InlineKeyboardMarkup([[InlineKeyboardButton("Назад", callback_data="Back")]])
+        )
+
+    async def on_callback(self, update, context):
+        data = update.callback_query.data
+        await update.callback_query.answer()
+        if data == "Back":
+            return MyAttendance(self.date)
+
+
+
 @dataclass
 class AdminAccessDenied(State):
     async def on_enter(self, update, context):
@@ -487,7 +597,7 @@ class AdminAccessDenied(State):
 @dataclass
 class Admin(State):
     async def on_enter(self, update, context):
-        user = db.get_user_by_telegram(update.effective_user.id)
+        user = await adb.get_user_by_telegram(update.effective_user.id)
         if not user:
             return AdminAccessDenied()
         
@@ -500,6 +610,7 @@ class Admin(State):
             markup=InlineKeyboardMarkup([
                 [InlineKeyboardButton("Пари", callback_data="Lessons"), InlineKeyboardButton("Чергування", callback_data="Duties")],
                 [InlineKeyboardButton("Дисципліни", callback_data="Subjects"), InlineKeyboardButton("Юзери", callback_data="Users")],
+                [InlineKeyboardButton("Статистика", callback_data="Statistics"), InlineKeyboardButton("Експорт", callback_data="Export")],
                 [InlineKeyboardButton("Назад", callback_data="Back")]
             ])
         )
@@ -520,11 +631,81 @@ class Admin(State):
         elif data == "Users":
             return Users()
 
+        elif data == "Statistics":
+            return Statistics()
+
+        elif data == "Export":
+            return ExportDates()
+
         elif data == "Back":
             return Home()
 
 
 
+@dataclass
+class Statistics(State):
+    async def on_enter(self, update, context):
+        summary = await adb.get_summary_overview()
+        await self.__send_message__(
+            update, context,
+            "\n".join(
+                ["Статистика відвідуваності (Є / Ф / Н):"]
+                +
+                [f"{row.name}: {row.present} / {row.formal_present} / {row.unpresent}" for row in summary]
+            ) if summary else "Статистики поки немає",
+            InlineKeyboardMarkup([[InlineKeyboardButton("Назад", callback_data="Back")]])
+        )
+
+    async def on_callback(self, update, context):
+        data = update.callback_query.data
+        await update.callback_query.answer()
+        if data == "Back":
+            return Admin()
+
+
+
+@dataclass
+class ExportDates(State):
+    async def on_enter(self, update, context):
+        await self.__send_message__(
+            update, context,
+            "Надішли період для експорту відвідуваності\nФормат: ДД.ММ.РРРР-ДД.ММ.РРРР",
+            InlineKeyboardMarkup([[InlineKeyboardButton("Назад", callback_data="Back")]])
+        )
+
+    async def on_message(self, update, context):
+        text = update.message.text
+        if text and "-" in text:
+            start, end = [StrToDate(date) for date in text.split("-", 1)]
+            if start and end and start <= end:
+                return Export(start, end)
+
+    async def on_callback(self, update, context):
+        data = update.callback_query.data
+        await update.callback_query.answer()
+        if data == "Back":
+            return Admin()
+
+
+
+@dataclass
+class Export(State):
+    start: datetime
+    end: datetime
+
+    async def on_enter(self, update, context):
+        with tempfile.TemporaryFile() as file:
+            await adb.write_attendance(self.start, self.end, file)
+            file.seek(0)
+            await context.bot.send_document(
+                update.effective_chat.id,
+                file,
+                filename=f"attendance_{self.start.strftime("%d.%m.%Y")}-{self.end.strftime("%d.%m.%Y")}.xlsx"
+            )
+        return Admin()
+
+
+
 @dataclass
 class AddLessonDate(State):
     async def on_enter(self, update, context):
@@ -591,19 +772,19 @@ class AddLessonSubject(State):
         await self.__send_message__(
             update, context,
             "Вибери дисципліну",
-            InlineKeyboardMarkup([[InlineKeyboardButton(subject.name, callback_data=subject.id)] for subject in db.get_active_subjects()])
+            InlineKeyboardMarkup([[InlineKeyboardButton(subject.name, callback_data=subject.id)] for subject in await adb.get_active_subjects()])
         )
     
     async def on_callback(self, update, context):
         data = update.callback_query.data
         await update.callback_query.answer()
         if data.isdigit():
-            if db.get_subject_by_id(data):
-                db.add_lesson(data, self.index, self.date)
-                lesson = db.get_lesson_by_date_index(self.date, self.index)
-                for student in db.get_users_by_role("student"):
-                    db.set_attendance(lesson.id, student.id, "present")
-                return Attendance(db.get_lesson_by_date_index(self.date, self.index).id)
+            if await adb.get_subject_by_id(data):
+                await adb.add_lesson(data, self.index, self.date)
+                lesson = await adb.get_lesson_by_date_index(self.date, self.index)
+                await adb.seed_attendance(lesson.id, "present")
+                drop_windows("lessons", "attendance")
+                return Attendance(lesson.id)
 
 
 
@@ -649,7 +830,7 @@ class Lessons(State):
     date: datetime
     
     async def on_enter(self, update, context):
-        lessons = db.get_lessons_by_date(self.date)
+        lessons = [lesson for lesson in await get_window(update, "lessons", self.date, adb.get_lessons_between) if lesson.date == self.date]
         await self.__send_message__(
             update, context,
             f"Пари за {self.date.strftime("%d.%m.%Y")}",
@@ -699,7 +880,7 @@ class Lesson(State):
     lesson_id: int
 
     async def on_enter(self, update, context):
-        lesson = db.get_lesson_by_id(self.lesson_id)
+        lesson = await adb.get_lesson_by_id(self.lesson_id)
         await self.__send_message__(
             update, context,
             f"{lesson.date.strftime("%d.%m.%Y")}, {lesson.index}. {lesson.subject.name}",
@@ -727,7 +908,7 @@ class Lesson(State):
             return Attendance(self.lesson_id)
 
         elif data == "Back":
-            return Lessons(db.get_lesson_by_id(self.lesson_id).date)
+            return Lessons((await adb.get_lesson_by_id(self.lesson_id)).date)
 
 
 
@@ -743,7 +924,7 @@ class LessonSetSubject(State):
                 [
                     [
                         InlineKeyboardButton(subject.name, callback_data=subject.id)
-                    ] for subject in db.get_active_subjects()
+                    ] for subject in await adb.get_active_subjects()
                 ]
             )
         )
@@ -752,8 +933,9 @@ class LessonSetSubject(State):
         data = update.callback_query.data
         await update.callback_query.answer()
         if data.isdigit():
-            lesson = db.get_lesson_by_id(self.lesson_id)
-            db.add_lesson(data, lesson.index, lesson.date)
+            lesson = await adb.get_lesson_by_id(self.lesson_id)
+            await adb.add_lesson(data, lesson.index, lesson.date)
+            drop_windows("lessons")
             return Lesson(lesson.id)
 
 
@@ -763,15 +945,17 @@ class Attendance(State):
     lesson_id: int
 
     async def on_enter(self, update, context):
-        lesson = db.get_lesson_by_id(self.lesson_id)
+        lesson = await adb.get_lesson_by_id(self.lesson_id)
+        attendance = await adb.get_lesson_attendance(self.lesson_id)
+        users = {user.id: user for user in await adb.get_users_by_ids([att.user_id for att in attendance])}
         await self.__send_message__(
             update, context,
             f"Присутні на {lesson.date.strftime("%d.%m.%Y")}, {lesson.index}. {lesson.subject.name}",
             InlineKeyboardMarkup(
                 [
                     [
-                        InlineKeyboardButton(f"{"🟢" if att.status == "present" else ("🔴" if att.status == "unpresent" else "🟡")} {db.get_user_by_id(att.user_id).surname}", callback_data=att.user_id)
-                    ] for att in db.get_lesson_attendance(self.lesson_id)
+                        InlineKeyboardButton(f"{"🟢" if att.status == "present" else ("🔴" if att.status == "unpresent" else "🟡")} {users[att.user_id].surname}", callback_data=att.user_id)
+                    ] for att in attendance
                 ]
                 +
                 [
@@ -790,13 +974,14 @@ class Attendance(State):
             return Lesson(self.lesson_id)
         
         elif data.isdigit():
-            att = db.get_user_on_lesson_attendance(data, self.lesson_id)
+            att = await adb.get_user_on_lesson_attendance(data, self.lesson_id)
             if att.status == "present":
-                db.set_attendance(att.lesson_id, att.user_id, "unpresent")
+                await adb.set_attendance(att.lesson_id, att.user_id, "unpresent")
             elif att.status == "unpresent":
-                db.set_attendance(att.lesson_id, att.user_id, "formal_present")
+                await adb.set_attendance(att.lesson_id, att.user_id, "formal_present")
             else:
-                db.set_attendance(att.lesson_id, att.user_id, "present")
+                await adb.set_attendance(att.lesson_id, att.user_id, "present")
+            drop_windows("attendance")
             return Attendance(self.lesson_id)
 
 
@@ -839,7 +1024,8 @@ class Duties(State):
     date: datetime
 
     async def on_enter(self, update, context):
-        duty = db.get_duty_by_date(self.date)
+        duties = await get_window(update, "duties", self.date, adb.get_duties_between)
+        duty = next((duty for duty in duties if duty.date == self.date), None)
         await self.__send_message__(
             update, context,
             f"Чергування {self.date.strftime("%d.%m.%Y")} - {("🟢" if duty.status == "done" else "🔴") if duty else "Немає"}\nЧергові:\n{"\n".join(dutier.surname for dutier in duty.dutiers) if duty else "Немає"}",
@@ -851,7 +1037,8 @@ class Duties(State):
                     ]
                     if duty else
                     [
-                        InlineKeyboardButton("Автовибір", callback_data="Autochoose")
+                        InlineKeyboardButton("Автовибір", callback_data="Autochoose"),
+                        InlineKeyboardButton("План", callback_data="Plan")
                     ],
                     [
                         InlineKeyboardButton("⬅️", callback_data="Previous"),
@@ -867,19 +1054,23 @@ class Duties(State):
         await update.callback_query.answer()
 
         if data == "Status":
-            duty = db.get_duty_by_date(self.date)
+            duty = await adb.get_duty_by_date(self.date)
             if duty:
-                db.set_duty_status(duty.id, "done" if duty.status == "undone" else "undone")
+                await adb.set_duty_status(duty.id, "done" if duty.status == "undone" else "undone")
+                drop_windows("duties")
                 return Duties(self.date)
             
         elif data == "Dutiers":
-            duty = db.get_duty_by_date(self.date)
+            duty = await adb.get_duty_by_date(self.date)
             if duty:
                 return Dutiers(duty.id)
 
         elif data == "Autochoose":
             return AutoDutyAmount(self.date)
         
+        elif data == "Plan":
+            return AutoPlanDays(self.date)
+        
         elif data == "Previous":
             return Duties(self.date - timedelta(days=1))
         
@@ -896,13 +1087,13 @@ class Dutiers(State):
     duty_id: int
     
     async def on_enter(self, update, context):
-        duty = db.get_duty_by_id(self.duty_id)
+        duty = await adb.get_duty_by_id(self.duty_id)
         await self.__send_message__(
             update, context,
             f"Чергові {duty.date.strftime("%d.%m.%Y")}",
             InlineKeyboardMarkup(
                 [
-                    [InlineKeyboardButton(f"{"🟢" if dutier in duty.dutiers else "🔴"} {dutier.surname}", callback_data=dutier.id)] for dutier in db.get_users_by_role("dutier")
+                    [InlineKeyboardButton(f"{"🟢" if dutier in duty.dutiers else "🔴"} {dutier.surname}", callback_data=dutier.id)] for dutier in await adb.get_users_by_role("dutier")
                 ]
                 +
                 [
@@ -916,14 +1107,15 @@ class Dutiers(State):
         await update.callback_query.answer()
 
         if data == "Back":
-            return Duties(db.get_duty_by_id(self.duty_id).date)
+            return Duties((await adb.get_duty_by_id(self.duty_id)).date)
         
         elif data.isdigit():
-            duty = db.get_duty_by_id(self.duty_id)
-            if db.get_user_by_id(data) in duty.dutiers:
-                db.unassign_to_duty(duty.id, data)
+            duty = await adb.get_duty_by_id(self.duty_id)
+            if await adb.get_user_by_id(data) in duty.dutiers:
+                await adb.unassign_to_duty(duty.id, data)
             else:
-                db.assign_to_duty(duty.id, data)
+                await adb.assign_to_duty(duty.id, data)
+            drop_windows("duties")
             return Dutiers(duty.id)
 
 
@@ -952,10 +1144,9 @@ class AutoDutyChoose(State):
     dutiers_amount: int
 
     async def on_enter(self, update, context):
-        dutiers_list = db.get_duty_order()
-        self.dutiers_amount = min(self.dutiers_amount, len(dutiers_list))
-        choosen_dutiers = [dutiers_list[i] for i in range(self.dutiers_amount)]
-        return AutoDutyConfirm(self.date, choosen_dutiers)
+        dutiers_list = await adb.get_duty_order()
+        choosen_dutiers = dutiers_list[:self.dutiers_amount]
+        return AutoDutyConfirm(self.date, choosen_dutiers, self.dutiers_amount)
 
 
 
@@ -963,11 +1154,13 @@ class AutoDutyChoose(State):
 class AutoDutyConfirm(State):
     date: datetime
     dutiers: List[db.User]
+    requested: int = 0
 
     async def on_enter(self, update, context):
+        shortage = [f"Доступно лише {len(self.dutiers)} з {self.requested}"] if len(self.dutiers) < self.requested else []
         await self.__send_message__(
             update, context,
-            "\n".join(["Вибрані чергові:"] + [dutier.surname for dutier in self.dutiers]),
+            "\n".join(shortage + ["Вибрані чергові:"] + [dutier.surname for dutier in self.dutiers]),
             InlineKeyboardMarkup([
                 [
                     InlineKeyboardButton("Підтвердити", callback_data="Confirm"),
@@ -994,10 +1187,13 @@ class AutoDutyNotify(State):
     dutiers: List[db.User]
 
     async def on_enter(self, update, context):
-        groups = db.get_groups()
-        for group in groups:
-            await context.bot.send_message(group, f"Привітаємо чергових {self.date.strftime("%d.%m.%Y")}:\n{"\n".join([dutier.surname for dutier in self.dutiers])}")
-        return AutoDutySave(self.date, self.dutiers)
+        await self.__send_message__(update, context, "Надсилаю сповіщення...")
+        delivery = await broadcast.broadcast(
+            context.bot,
+            await adb.get_groups(),
+            f"Привітаємо чергових {self.date.strftime("%d.%m.%Y")}:\n{"\n".join([dutier.surname for dutier in self.dutiers])}"
+        )
+        return AutoDutySave(self.date, self.dutiers, delivery)
 
 
 
@@ -1005,13 +1201,128 @@ class AutoDutyNotify(State):
 class AutoDutySave(State):
     date: datetime
     dutiers: List[db.User]
+    delivery: Dict[int, str]
 
     async def on_enter(self, update, context):
-        db.add_duty(self.date)
-        duty = db.get_duty_by_date(self.date)
+        await adb.add_duty(self.date)
+        duty = await adb.get_duty_by_date(self.date)
         for dutier in self.dutiers:
-            db.assign_to_duty(duty.id, dutier.id)
-        return Home()
+            await adb.assign_to_duty(duty.id, dutier.id)
+        drop_windows("duties")
+        return AutoDutyReport(self.delivery)
+
+
+
+@dataclass
+class AutoDutyReport(State):
+    delivery: Dict[int, str]
+
+    async def on_enter(self, update, context):
+        statuses = list(self.delivery.values())
+        failed = [str(chat_id) for chat_id, status in self.delivery.items() if status == broadcast.FAILED]
+        unknown = [str(chat_id) for chat_id, status in self.delivery.items() if status == broadcast.UNKNOWN]
+        await self.__send_message__(
+            update, context,
+            f"Чергових збережено\n" \
+            f"Сповіщення надіслано: {statuses.count(broadcast.SENT)}/{len(statuses)}\n" \
+            f"Видалено недоступних груп: {statuses.count(broadcast.REMOVED)}" \
+            f"{"\nНе вдалося надіслати: " + ", ".join(failed) if failed else ""}" \
+            f"{"\nНевідомо, чи доставлено: " + ", ".join(unknown) if unknown else ""}",
+            InlineKeyboardMarkup([[InlineKeyboardButton("Головна", callback_data="Back")]])
+        )
+
+    async def on_callback(self, update, context):
+        data = update.callback_query.data
+        await update.callback_query.answer()
+        if data == "Back":
+            return Home()
+
+
+
+@dataclass
+class AutoPlanDays(State):
+    date: datetime
+
+    async def on_enter(self, update, context):
+        await self.__send_message__(
+            update, context,
+            "На скільки днів спланувати чергування?",
+            InlineKeyboardMarkup([
+                [InlineKeyboardButton(f"{days} днів", callback_data=days) for days in [7, 14, 28]],
+                [InlineKeyboardButton("Назад", callback_data="Back")]
+            ])
+        )
+
+    async def on_callback(self, update, context):
+        data = update.callback_query.data
+        await update.callback_query.answer()
+
+        if data == "Back":
+            return Duties(self.date)
+        
+        elif data.isdigit():
+            return AutoPlanAmount(self.date, int(data))
+
+
+
+@dataclass
+class AutoPlanAmount(State):
+    date: datetime
+    days: int
+
+    async def on_enter(self, update, context):
+        await self.__send_message__(
+            update, context,
+            "Вибери кількість чергових на день",
+            InlineKeyboardMarkup([[InlineKeyboardButton(i, callback_data=i) for i in range(1, 5)]])
+        )
+
+    async def on_callback(self, update, context):
+        data = update.callback_query.data
+        await update.callback_query.answer()
+        if data.isdigit():
+            return AutoPlanConfirm(self.date, self.days, int(data))
+
+
+
+@dataclass
+class AutoPlanConfirm(State):
+    date: datetime
+    days: int
+    dutiers_amount: int
+    schedule: Dict[datetime, List[db.User]] = field(default_factory=dict)
+
+    async def on_enter(self, update, context):
+        self.schedule = await adb.plan_duties(max(self.date, datetime.now().date()), self.days, self.dutiers_amount)
+        await self.__send_message__(
+            update, context,
+            "\n".join(
+                ["План чергувань:"]
+                +
+                [
+                    f"{date.strftime("%d.%m.%Y")}: {", ".join(dutier.surname for dutier in dutiers) if dutiers else "немає доступних"}"
+                    for date, dutiers in self.schedule.items()
+                ]
+            ) if self.schedule else "Усі дні вже мають чергування",
+            InlineKeyboardMarkup([
+                [
+                    InlineKeyboardButton("Підтвердити", callback_data="Confirm"),
+                    InlineKeyboardButton("Назад", callback_data="Back")
+                ]
+            ])
+        )
+
+    async def on_callback(self, update, context):
+        data = update.callback_query.data
+        await update.callback_query.answer()
+
+        if data == "Confirm":
+            await adb.save_duty_plan({date: [dutier.id for dutier in dutiers] for date, dutiers in self.schedule.items()})
+            drop_windows("duties")
+            return Duties(self.date)
+        
+        elif data == "Back":
+            return Duties(self.date)
 
 
 
@@ -1023,7 +1334,7 @@ class Subjects(State):
             "Дисципліни",
             InlineKeyboardMarkup(
                 [
-                    [InlineKeyboardButton(f"{"🟢" if subject.is_active else "🔴"} {subject.name}", callback_data=subject.id)] for subject in db.get_subjects()
+                    [InlineKeyboardButton(f"{"🟢" if subject.is_active else "🔴"} {subject.name}", callback_data=subject.id)] for subject in await adb.get_subjects()
                 ]
                 +
                 [
@@ -1059,7 +1370,7 @@ class SubjectsAddName(State):
         text = update.message.text
         subjects = [subject.strip() for subject in text.split(",")]
         for subject in subjects:
-            db.add_subject(subject)
+            await adb.add_subject(subject)
         return Subjects()
         
 
@@ -1069,7 +1380,7 @@ class Subject(State):
     subject_id: int
 
     async def on_enter(self, update, context):
-        subject = db.get_subject_by_id(self.subject_id)
+        subject = await adb.get_subject_by_id(self.subject_id)
         await self.__send_message__(
             update, context,
             f"Вибери дію для {subject.name}",
@@ -1089,10 +1400,11 @@ class Subject(State):
     async def on_callback(self, update, context):
         data = update.callback_query.data
         await update.callback_query.answer()
-        subject = db.get_subject_by_id(self.subject_id)
+        subject = await adb.get_subject_by_id(self.subject_id)
 
         if data == "Status":
-            db.set_subject_status(subject.id, not subject.is_active)
+            await adb.set_subject_status(subject.id, not subject.is_active)
+            drop_windows("lessons")
             return Subject(self.subject_id)
         
         elif data == "Rename":
@@ -1108,7 +1420,7 @@ class SubjectRename(State):
     subject_id: int
 
     async def on_enter(self, update, context):
-        subject = db.get_subject_by_id(self.subject_id)
+        subject = await adb.get_subject_by_id(self.subject_id)
         await self.__send_message__(
             update, context,
             f"Надішли нову назву для дисципліни {subject.name}"
@@ -1116,7 +1428,8 @@ class SubjectRename(State):
 
     async def on_message(self, update, context):
         text = update.message.text
-        db.set_subject_name(self.subject_id, text)
+        await adb.set_subject_name(self.subject_id, text)
+        drop_windows("lessons")
         return Subject(self.subject_id)
 
 
@@ -1128,7 +1441,7 @@ class Users(State):
             update, context, 
             "Користувачі",
             InlineKeyboardMarkup(
-                [[InlineKeyboardButton(f"{user.surname} - {user.telegram_id}", callback_data=user.id)] for user in db.get_users()]
+                [[InlineKeyboardButton(f"{user.surname} - {user.telegram_id}", callback_data=user.id)] for user in await adb.get_users()]
                 +
                 [[InlineKeyboardButton("Назад", callback_data="Back")]]
             )
@@ -1141,7 +1454,7 @@ class Users(State):
         if data == "Back":
             return Admin()
         
-        elif "superadmin" in db.get_user_by_id(data).roles and "superadmin" not in db.get_user_by_telegram(update.effective_user.id).roles:
+        elif "superadmin" in (await adb.get_user_by_id(data)).roles and "superadmin" not in (await adb.get_user_by_telegram(update.effective_user.id)).roles:
             return Home()
         
         else:
@@ -1154,7 +1467,7 @@ class User(State):
     user_id: int
 
     async def on_enter(self, update, context):
-        user = db.get_user_by_id(self.user_id)
+        user = await adb.get_user_by_id(self.user_id)
         await self.__send_message__(
             update, context,
             f"Вибери дію для {user.surname} - {user.telegram_id}",
@@ -1184,11 +1497,11 @@ class User(State):
             return UserChangeSurname(self.user_id)
         
         elif data in ["student", "admin", "dutier"]:
-            if data in db.get_user_by_id(self.user_id).roles:
-                db.remove_role(self.user_id, data)
+            if data in (await adb.get_user_by_id(self.user_id)).roles:
+                await adb.remove_role(self.user_id, data)
                 return User(self.user_id)
             else:
-                db.add_role(self.user_id, data)
+                await adb.add_role(self.user_id, data)
                 return User(self.user_id)
 
 
@@ -1198,7 +1511,7 @@ class UserChangeSurname(State):
     user_id: int
     
     async def on_enter(self, update, context):
-        user = db.get_user_by_id(self.user_id)
+        user = await adb.get_user_by_id(self.user_id)
         await self.__send_message__(
             update, context,
             f"Надішли нове ім'я користувача {user.surname} - {user.telegram_id}"
@@ -1207,5 +1520,5 @@ class UserChangeSurname(State):
     async def on_message(self, update, context):
         text = update.message.text
         surname = text.capitalize()
-        db.set_user_surname(self.user_id, surname)
+        await adb.set_user_surname(self.user_id, surname)
         return User(self.user_id)
\ No newline at end of file
@@ -0,0 +1,6 @@
+use bot;
+
+-- marks a throwaway benchmark server; bench.py and loadtest.py refuse to wipe a database without it
+CREATE TABLE IF NOT EXISTS `bench_instance` (
+  `created_at` datetime NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
@@ -11,7 +11,9 @@ CREATE TABLE IF NOT EXISTS `roles` (
   `id` integer PRIMARY KEY AUTO_INCREMENT,
   `user_id` integer NOT NULL,
   `role` varchar(255) NOT NULL,
-  FOREIGN KEY (user_id) REFERENCES users(id)
+  FOREIGN KEY (user_id) REFERENCES users(id),
+  UNIQUE INDEX `roles_user_role` (`user_id`, `role`),
+  INDEX `roles_role_user` (`role`, `user_id`)
 );
 
 CREATE TABLE IF NOT EXISTS `subjects` (
@@ -25,7 +27,8 @@ CREATE TABLE IF NOT EXISTS `lessons` (
   `subject_id` integer NOT NULL,
   `index` integer NOT NULL,
   `date` date NOT NULL,
-  FOREIGN KEY (subject_id) REFERENCES subjects(id)
+  FOREIGN KEY (subject_id) REFERENCES subjects(id),
+  UNIQUE INDEX `lessons_date_index` (`date`, `index`)
 );
 
 CREATE TABLE IF NOT EXISTS `attendance` (
@@ -34,13 +37,28 @@ CREATE TABLE IF NOT EXISTS `attendance` (
   `user_id` integer NOT NULL,
   `status` enum('present','formal_present','unpresent') NOT NULL,
   FOREIGN KEY (lesson_id) REFERENCES lessons(id),
-  FOREIGN KEY (user_id) REFERENCES users(id)
+  FOREIGN KEY (user_id) REFERENCES users(id),
+  UNIQUE INDEX `attendance_lesson_user` (`lesson_id`, `user_id`),
+  INDEX `attendance_user_status` (`user_id`, `status`)
+);
+
+CREATE TABLE IF NOT EXISTS `attendance_summary` (
+  `user_id` integer NOT NULL,
+  `subject_id` integer NOT NULL,
+  `present` integer NOT NULL DEFAULT 0,
+  `formal_present` integer NOT NULL DEFAULT 0,
+  `unpresent` integer NOT NULL DEFAULT 0,
+  PRIMARY KEY (`user_id`, `subject_id`),
+  FOREIGN KEY (user_id) REFERENCES users(id),
+  FOREIGN KEY (subject_id) REFERENCES subjects(id),
+  INDEX `attendance_summary_subject` (`subject_id`)
 );
 
 CREATE TABLE IF NOT EXISTS `duties` (
   `id` integer PRIMARY KEY AUTO_INCREMENT,
   `date` date NOT NULL,
-  `status` enum('done','undone') NOT NULL
+  `status` enum('done','undone') NOT NULL,
+  UNIQUE INDEX `duties_date` (`date`)
 );
 
 CREATE TABLE IF NOT EXISTS `duty_assignments` (
@@ -48,21 +66,38 @@ CREATE TABLE IF NOT EXISTS `duty_assignments` (
   `duty_id` integer NOT NULL,
   `user_id` integer NOT NULL,
   FOREIGN KEY (duty_id) REFERENCES duties(id),
-  FOREIGN KEY (user_id) REFERENCES users(id)
+  FOREIGN KEY (user_id) REFERENCES users(id),
+  UNIQUE INDEX `duty_assignments_duty_user` (`duty_id`, `user_id`),
+  INDEX `duty_assignments_user` (`user_id`)
+);
+
+CREATE TABLE IF NOT EXISTS `last_duties` (
+  `user_id` integer PRIMARY KEY,
+  `date` date NOT NULL,
+  FOREIGN KEY (user_id) REFERENCES users(id),
+  INDEX `last_duties_date` (`date`)
 );
 
 CREATE TABLE IF NOT EXISTS `groups` (
   `id` integer PRIMARY KEY AUTO_INCREMENT,
-  `telegram_id` bigint NOT NULL
+  `telegram_id` bigint NOT NULL,
+  UNIQUE INDEX `groups_telegram_id` (`telegram_id`)
 );
 
 CREATE TABLE IF NOT EXISTS `duty_photos` (
   `id` integer PRIMARY KEY AUTO_INCREMENT,
   `user_id` integer NOT NULL,
   `duty_id` integer NOT NULL,
-  `photo` longblob NOT NULL,
+  `photo` longblob,
+  `sha256` char(64),
+  `size` integer,
+  `preview_sha256` char(64),
+  `file_id` varchar(255),
   FOREIGN KEY (duty_id) REFERENCES duties(id),
-  FOREIGN KEY (user_id) REFERENCES users(id)
+  FOREIGN KEY (user_id) REFERENCES users(id),
+  INDEX `duty_photos_duty` (`duty_id`),
+  INDEX `duty_photos_sha256` (`sha256`),
+  INDEX `duty_photos_preview_sha256` (`preview_sha256`)
 );
 
 INSERT INTO users (surname, telegram_id) VALUES ('Ковальчук', 578368948);